@@ -0,0 +1,136 @@
+import copy
+import logging
+from collections import deque
+from sensorDatabase import ROW_COLUMNS
+
+log = logging.getLogger(__name__)
+
+# metric -> threshold (raise above), clear (clear below, hysteresis), window_ms (time span of
+# the rolling mean, 1 minute as on the pages, independent of the sender's cadence), hold_off
+# (ms the mean has to stay above the threshold before an alert is raised)
+ALERT_RULES = {
+    'co2': {'threshold': 1000, 'clear': 900, 'window_ms': 60 * 1000, 'hold_off': 60 * 1000},     # ppm
+    'tvoc': {'threshold': 56, 'clear': 50, 'window_ms': 60 * 1000, 'hold_off': 60 * 1000},       # ppb
+    'eco2': {'threshold': 1000, 'clear': 900, 'window_ms': 60 * 1000, 'hold_off': 60 * 1000},    # ppm
+    'pm_2_5': {'threshold': 25, 'clear': 20, 'window_ms': 60 * 1000, 'hold_off': 60 * 1000},     # µg/m³
+    'pm_10_0': {'threshold': 50, 'clear': 40, 'window_ms': 60 * 1000, 'hold_off': 60 * 1000},    # µg/m³
+}
+
+ALERT_SQL = "INSERT INTO alerts (ts_ms, gateway, metric, event, value, threshold) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+class RollingMean:
+    """Mean of the samples of the last window_ms, O(1) amortized per sample (deque and running sum)"""
+
+    def __init__(self, window_ms):
+        self.window_ms = window_ms
+        self.samples = deque()  # (ts_ms, value), oldest first
+        self.total = 0.0
+
+    def add(self, ts_ms, value):
+        self.samples.append((ts_ms, value))
+        self.total += value
+        while self.samples[0][0] <= ts_ms - self.window_ms:
+            self.total -= self.samples.popleft()[1]
+        return self.total / len(self.samples)
+
+
+class AlertState:
+    # rolling mean and alert state of one node and metric
+    def __init__(self, rule, active=False):
+        self.rule = rule
+        self.mean = RollingMean(rule['window_ms'])
+        self.active = active
+        self.above_since = None     # ts_ms the mean first exceeded the threshold
+
+    def update(self, ts_ms, value):
+        """Add a sample, returns 'raised', 'cleared' or None and the rolling mean"""
+        mean = self.mean.add(ts_ms, value)
+        if not self.active:
+            if mean <= self.rule['threshold']:
+                self.above_since = None
+                return None, mean
+            if self.above_since is None:
+                self.above_since = ts_ms
+            if ts_ms - self.above_since >= self.rule['hold_off']:
+                self.active = True
+                return 'raised', mean
+        elif mean < self.rule['clear']:
+            self.active = False
+            self.above_since = None
+            return 'cleared', mean
+        return None, mean
+
+
+class AlertEngine:
+    """
+    Writer batch hook: checks every new reading against ALERT_RULES per gateway and metric and
+    writes raised/cleared events to the alerts table (same transaction as the readings).
+    Alerts still active in the table are picked up on start, so a restart does not raise them again.
+    States touched by a batch are saved first and restored by rollback() when the writer's
+    transaction fails, so a batch that is written again is not counted twice.
+    """
+
+    def __init__(self, conn=None, rules=ALERT_RULES):
+        self.rules = rules
+        self.states = {}    # (gateway, metric) -> AlertState
+        self.saved = {}     # states before the current batch, None for states it created
+        self.pending = []   # events of the current batch, logged once committed
+        if conn is not None:
+            for gateway, metric in active_alerts(conn):
+                if metric in rules:
+                    self.states[(gateway, metric)] = AlertState(rules[metric], active=True)
+
+    def __call__(self, conn, rows):
+        ts_index = ROW_COLUMNS.index('ts_ms')
+        gateway_index = ROW_COLUMNS.index('gateway')
+        metric_index = [(metric, ROW_COLUMNS.index(metric)) for metric in self.rules]
+        events = []
+        for row in rows:
+            for metric, i in metric_index:
+                value = row[i]
+                if not isinstance(value, (int, float)) or value != value:   # missing or NaN
+                    continue
+                key = (row[gateway_index], metric)
+                state = self.states.get(key)
+                if key not in self.saved:
+                    self.saved[key] = copy.deepcopy(state)
+                if state is None:
+                    state = self.states[key] = AlertState(self.rules[metric])
+                event, mean = state.update(row[ts_index], value)
+                if event:
+                    threshold = self.rules[metric]['threshold' if event == 'raised' else 'clear']
+                    events.append((row[ts_index], row[gateway_index], metric, event, mean, threshold))
+        if events:
+            conn.executemany(ALERT_SQL, events)
+            self.pending.extend(events)
+
+    def commit(self):
+        for _, gateway, metric, event, mean, threshold in self.pending:
+            log.warning(f"Alert {event}: {metric} ({gateway}) mean {mean:.1f}, limit {threshold}")
+        self.saved = {}
+        self.pending = []
+
+    def rollback(self):
+        for key, state in self.saved.items():
+            if state is None:
+                self.states.pop(key, None)
+            else:
+                self.states[key] = state
+        self.saved = {}
+        self.pending = []
+
+
+def active_alerts(conn):
+    """(gateway, metric) of all alerts whose last event is 'raised'"""
+    return [(gateway, metric) for gateway, metric, _, _, _ in load_active_alerts(conn)]
+
+def load_active_alerts(conn):
+    # rows (gateway, metric, ts_ms, value, threshold) of the active alerts, newest first
+    return conn.execute('''
+        SELECT a.gateway, a.metric, a.ts_ms, a.value, a.threshold
+        FROM alerts a
+        JOIN (SELECT MAX(id) AS id FROM alerts GROUP BY gateway, metric) last ON last.id = a.id
+        WHERE a.event = 'raised'
+        ORDER BY a.ts_ms DESC
+    ''').fetchall()
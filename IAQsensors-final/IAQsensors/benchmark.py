@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from calculateIndeces import calculate_humidex_series
+from derivedMetrics import add_derived
+from frameReader import FrameReader, decode_frame
+from kalmanFilter import kalman_filter_batch, kalman_filter_self_predicting
+from onlineStats import OnlineStats, StatsEngine
+from replaySource import SYNTHETIC_METRICS, log_chunks
+from rollupTables import query_history, rebuild_rollups, update_rollups
+from sensorDataCollector import parse_frame, parse_sensor_data
+from sensorDatabase import DERIVED, INSERT_SQL, METRICS, connect, init_db
+
+# === CONFIGURATION ===
+SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+SEED = 42
+START_MS = 1750766400000    # 2025-06-24 12:00 UTC, first synthetic reading
+INTERVAL_MS = 5000          # synthetic sample interval
+BATCH_SIZE = 200            # rows per commit, as SensorDBWriter
+CHUNK = 100000              # rows generated at once, bounds memory of the large datasets
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results")
+
+# pure Python per-row loops are skipped above these sizes unless --no-limits is given; the ingest
+# benchmarks hold all frames in memory (about 900 bytes each, plus decoded copies)
+LIMITS = {
+    'frame_reader': 10 ** 5,
+    'parse_sensor_data': 10 ** 5,
+    'parse_frame': 10 ** 5,
+    'insert_with_hooks': 10 ** 6,
+    'kalman_filter_self_predicting': 10 ** 6,
+}
+
+
+# === DATASETS ===
+def dataset_chunks(n, chunk=CHUNK, seed=SEED):
+    """
+    Fixed synthetic readings: yields (ts_ms, values) blocks of at most chunk rows, values
+    (rows x METRICS) a random walk around the SYNTHETIC_METRICS start values. The same n and
+    seed always give the same data.
+    """
+    rng = np.random.default_rng(seed)
+    last = np.array([SYNTHETIC_METRICS[metric][0] for metric in METRICS])
+    step = np.array([SYNTHETIC_METRICS[metric][2] for metric in METRICS])
+    low = np.array([SYNTHETIC_METRICS[metric][3] for metric in METRICS])
+    for start in range(0, n, chunk):
+        rows = min(chunk, n - start)
+        values = np.maximum(low, last + np.cumsum(rng.normal(0, 1, (rows, len(METRICS))) * step, axis=0))
+        last = values[-1]
+        yield START_MS + INTERVAL_MS * np.arange(start, start + rows, dtype=np.int64), values
+
+def dataset_frame(n):
+    """Dataset as DataFrame like the pages get it (timestamp, ts_ms, metrics)"""
+    ts_parts, value_parts = zip(*dataset_chunks(n))
+    df = pd.DataFrame(np.concatenate(value_parts), columns=METRICS)
+    df.insert(0, 'ts_ms', np.concatenate(ts_parts))
+    df.insert(0, 'timestamp', pd.to_datetime(df['ts_ms'], unit='ms'))
+    return df
+
+def dataset_rows(n):
+    """Batches of BATCH_SIZE rows as the writer builds them (reading_row layout)"""
+    for ts_ms, values in dataset_chunks(n):
+        timestamps = pd.to_datetime(ts_ms, unit='ms').strftime('%Y-%m-%dT%H:%M:%S.%f').tolist()
+        rows = [[timestamp, ts, 'bench'] + metrics + [None] * len(DERIVED) for timestamp, ts, metrics in zip(timestamps, ts_ms.tolist(), values.tolist())]
+        for start in range(0, len(rows), BATCH_SIZE):
+            yield rows[start:start + BATCH_SIZE]
+
+def log_frames(n):
+    """n receiver frames (bytes) cycled from serial_log.txt"""
+    reader = FrameReader()
+    frames = []
+    for _, data in log_chunks():
+        frames.extend(frame.encode('latin-1', errors='ignore') for frame in reader.feed(data))
+    return [frames[i % len(frames)] for i in range(n)]
+
+
+# === TIMING ===
+def measure(func, repeats):
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return min(times), statistics.median(times)
+
+def repeats_for(n):
+    return 5 if n <= 10 ** 4 else 3 if n <= 10 ** 5 else 1
+
+
+# === BENCHMARKS ===
+def bench_ingest(n, frames):
+    """Frame cutting and parsing, rows = frames"""
+    text = [decode_frame(frame) for frame in frames]
+    lines = [frame.splitlines()[1:-1] for frame in text]    # inner lines, as parse_sensor_data gets them
+    stream = b"".join(frames)
+    return {
+        'frame_reader': lambda: FrameReader().feed(stream),
+        'parse_sensor_data': lambda: [parse_sensor_data(frame) for frame in lines],
+        'parse_frame': lambda: [parse_frame(frame) for frame in text],
+    }
+
+def insert_rows(conn, n, hooks=()):
+    # derived stage and one transaction per batch, like SensorDBWriter._flush
+    for rows in dataset_rows(n):
+        add_derived(rows)
+        with conn:
+            conn.executemany(INSERT_SQL, rows)
+            for hook in hooks:
+                hook(conn, rows)
+        for hook in hooks:
+            if hasattr(hook, 'commit'):
+                hook.commit()
+
+def fresh_db(directory, name):
+    path = os.path.join(directory, name)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    conn = connect(path)
+    init_db(conn)
+    return conn
+
+def bench_queries(conn, n):
+    """Page queries on a database with n readings"""
+    end_ms = START_MS + INTERVAL_MS * n
+    last_id = max(0, n - 10)
+    return {
+        # ReadingsCache: initial load and incremental refresh
+        'latest_1000': lambda: pd.read_sql_query("SELECT * FROM sensor_readings ORDER BY ts_ms DESC LIMIT ?", conn, params=(1000,)),
+        'latest_new_rows': lambda: pd.read_sql_query("SELECT * FROM sensor_readings WHERE id > ? ORDER BY id", conn, params=(last_id,)),
+        # IAQ Charts / dataVis time range selector
+        'range_1h': lambda: query_history(conn, METRICS, end_ms - 3600 * 1000, end_ms, 1500),
+        'range_1d': lambda: query_history(conn, METRICS, end_ms - 86400 * 1000, end_ms, 1500),
+        'range_30d': lambda: query_history(conn, METRICS, end_ms - 30 * 86400 * 1000, end_ms, 1500),
+    }
+
+def bench_analytics(df):
+    """Page analytics on a DataFrame with len(df) readings"""
+    values = df[METRICS].to_numpy(dtype=float)
+    co2 = df['co2'].to_numpy(dtype=float)
+    return {
+        'kalman_filter_self_predicting': lambda: kalman_filter_self_predicting(co2),
+        'kalman_filter_batch': lambda: kalman_filter_batch(values),
+        'calculate_humidex_series': lambda: calculate_humidex_series(df['temperature'], df['humidity']),
+        # correlation step of IAQ Charts, and the collector's running statistics
+        'corr_pandas': lambda: df[METRICS].corr(),
+        'corr_online_stats': lambda: OnlineStats.from_array(values).corr(),
+    }
+
+
+def run(sizes, limits, directory):
+    results = []
+
+    def skipped(name, n):
+        if n > limits.get(name, n):
+            print(f"{name:32} {n:>10,} rows  skipped (limit {limits[name]:,})")
+            return True
+        return False
+
+    def record(group, name, n, func, repeats=None):
+        if skipped(name, n):
+            return
+        repeats = repeats or repeats_for(n)
+        best, median = measure(func, repeats)
+        results.append({'group': group, 'benchmark': name, 'rows': n, 'repeats': repeats,
+                        'best_s': best, 'median_s': median, 'rows_per_s': n / best if best else None})
+        print(f"{name:32} {n:>10,} rows  {best * 1000:12.2f} ms  {n / best if best else 0:14,.0f} rows/s")
+
+    for n in sizes:
+        print(f"--- {n:,} rows ---")
+        ingest = ('frame_reader', 'parse_sensor_data', 'parse_frame')
+        if n <= max(limits.get(name, n) for name in ingest):
+            for name, func in bench_ingest(n, log_frames(n)).items():
+                record('ingest', name, n, func)
+        else:
+            for name in ingest:
+                skipped(name, n)    # frames are not even built
+
+        # storage benchmarks change the database, they run once
+        if not skipped('insert_with_hooks', n):
+            hooks_conn = fresh_db(directory, "hooks.db")
+            record('storage', 'insert_with_hooks', n,
+                   lambda: insert_rows(hooks_conn, n, hooks=[update_rollups, StatsEngine()]), repeats=1)
+            hooks_conn.close()
+        conn = fresh_db(directory, f"bench_{n}.db")
+        record('storage', 'insert', n, lambda: insert_rows(conn, n), repeats=1)
+        record('storage', 'rebuild_rollups', n, lambda: rebuild_rollups(conn), repeats=1)
+        for name, func in bench_queries(conn, n).items():
+            record('query', name, n, func)
+        conn.close()
+
+        df = dataset_frame(n)
+        for name, func in bench_analytics(df).items():
+            record('analytics', name, n, func)
+        del df
+    return results
+
+def environment():
+    return {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'sqlite': sqlite3.sqlite_version,
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'seed': SEED,
+    }
+
+def compare(results, previous_path):
+    """Print the speed ratio against an earlier results file (>1 = faster now)"""
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = {(r['benchmark'], r['rows']): r['best_s'] for r in json.load(f)['results']}
+    print(f"--- compared to {previous_path} ---")
+    for r in results:
+        before = previous.get((r['benchmark'], r['rows']))
+        if before:
+            print(f"{r['benchmark']:32} {r['rows']:>10,} rows  {before / r['best_s']:6.2f}x")
+
+
+# === MAIN ===
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ingest, storage, query and analytics hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="dataset sizes in rows")
+    parser.add_argument("--no-limits", action="store_true", help="also run pure Python loops on the largest sizes")
+    parser.add_argument("--out", help="results file (default: benchmark_results/benchmark-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    parser.add_argument("--tmp", help="directory for the benchmark databases (default: a temporary directory)")
+    args = parser.parse_args()
+
+    limits = {} if args.no_limits else LIMITS
+    with tempfile.TemporaryDirectory(dir=args.tmp) as directory:
+        results = run(sorted(args.sizes), limits, directory)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    print("Results saved to", out)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import logging
+import os
+import re
+from logging.handlers import RotatingFileHandler
+
+# === CONFIGURATION ===
+LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "error.log")
+LOG_MAX_BYTES = 1024 * 1024     # error.log is rotated to error.log.1 ... at this size
+LOG_BACKUPS = 3
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
+TAIL_BLOCK = 64 * 1024          # bytes read per step when seeking backwards
+TAIL_MAX_BYTES = 1024 * 1024    # at most this much of the end of the log is scanned for the tail
+FOLLOW_MAX_BYTES = 256 * 1024   # larger growth between two follow calls skips to the end
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}
+LEVEL_PATTERN = re.compile(r"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3} - ([A-Z]+) - ")
+
+
+def setup_logging(log_file=LOG_FILE, level=logging.INFO, file_level=logging.INFO):
+    """
+    Log to the console (from level on) and, with log_file, to a size-rotated file (from file_level
+    on, kept at LOG_BACKUPS + 1 files). Per-record DEBUG lines thus stay out of the file.
+    """
+    console = logging.StreamHandler()
+    console.setLevel(level)
+    handlers = [console]
+    if log_file:
+        file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+        file_handler.setLevel(file_level)
+        handlers.append(file_handler)
+    logging.basicConfig(level=min(level, file_level), format=LOG_FORMAT, handlers=handlers, force=True)
+
+
+# === TAIL READER ===
+def line_level(line):
+    # level of a record's first line, None for other lines (tracebacks, lines of old logs)
+    match = LEVEL_PATTERN.match(line)
+    return match.group(1) if match else None
+
+def filter_lines(lines, min_level=None):
+    """Lines of records at or above min_level, continuation lines go with the record before them"""
+    if min_level is None:
+        return list(lines)
+    threshold = LEVELS[min_level]
+    shown = []
+    keep = False
+    for line in lines:
+        level = line_level(line)
+        if level is not None:
+            keep = LEVELS.get(level, 0) >= threshold
+        if keep:
+            shown.append(line)
+    return shown
+
+def tail_lines(path, n=200, min_level=None, block=TAIL_BLOCK, max_bytes=TAIL_MAX_BYTES):
+    """
+    Last n lines of path (at or above min_level), read block by block backwards from the end,
+    so only the end of the log is read however large it is (at most max_bytes).
+    Returns (lines, end offset) - the offset to follow the log from.
+    """
+    if not os.path.exists(path):
+        return [], 0
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        data = b""
+        while position > 0 and end - position < max_bytes:
+            step = min(block, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+            lines = data.decode("utf-8", errors="replace").splitlines()
+            if position > 0:
+                lines = lines[1:]   # probably cut, read with the next block
+            if len(filter_lines(lines, min_level)) >= n:
+                break
+    if not data:
+        return [], end
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    if position > 0:
+        lines = lines[1:]
+    return filter_lines(lines, min_level)[-n:], end
+
+def follow_log(path, offset, max_bytes=FOLLOW_MAX_BYTES):
+    """
+    Complete lines appended since offset, returns (lines, new offset). A log that got smaller
+    (rotated or cleared) is read from its start, more than max_bytes of growth skips to the end.
+    """
+    if not os.path.exists(path):
+        return [], 0
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size < offset:
+            offset = 0
+        skipped = size - offset > max_bytes
+        if skipped:
+            offset = size - max_bytes
+        f.seek(offset)
+        data = f.read(size - offset)
+    end = data.rfind(b"\n") + 1     # a partial last line is read again next time
+    lines = data[:end].decode("utf-8", errors="replace").splitlines()
+    if skipped:
+        lines = lines[1:]
+    return lines, offset + end
@@ -0,0 +1,135 @@
+import json
+import logging
+import re
+import threading
+from datetime import datetime
+from sensorDatabase import DB_NAME, connect, to_epoch_ms
+
+log = logging.getLogger(__name__)
+
+# === CONFIGURATION ===
+METRICS_INTERVAL = 10   # s, a snapshot is written to collector_metrics this often
+# upper bounds (ms) of the commit latency histogram buckets, the last bucket takes the rest
+LATENCY_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+SNAPSHOT_SQL = "INSERT OR REPLACE INTO collector_metrics (ts_ms, state) VALUES (?, ?)"
+
+
+def error_sensor(message):
+    # "SCD41 read failed: -5" -> "SCD41"
+    match = re.match(r"\s*([A-Za-z0-9_]+)", str(message))
+    return match.group(1) if match else "unknown"
+
+
+class CollectorMetrics:
+    """
+    Counters of a running collector, updated by the reader threads and the writer (thread safe).
+    Counters are cumulative since started_ms, rates are the difference of two snapshots.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_ms = to_epoch_ms(datetime.now())
+        self.frames = {}            # gateway -> frames received
+        self.parse_failures = {}    # gateway -> frames without any value
+        self.error_payloads = {}    # sensor -> {"error": ...} payloads of the sender
+        self.reconnects = {}        # gateway -> serial port reopened after an error
+        self.last_seen = {}         # gateway -> ts_ms of the last frame
+        self.commit_ms = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.commits = 0
+        self.commit_seconds = 0.0
+        self.queue_depth = lambda: 0    # set by the collector (writer queue size)
+        self.writer = None              # written/dropped counters are read from the writer
+
+    def _count(self, counter, key):
+        with self.lock:
+            counter[key] = counter.get(key, 0) + 1
+
+    def frame(self, gateway):
+        with self.lock:
+            self.frames[gateway] = self.frames.get(gateway, 0) + 1
+            self.last_seen[gateway] = to_epoch_ms(datetime.now())
+
+    def parse_failure(self, gateway):
+        self._count(self.parse_failures, gateway)
+
+    def error_payload(self, message):
+        self._count(self.error_payloads, error_sensor(message))
+
+    def reconnect(self, gateway):
+        self._count(self.reconnects, gateway)
+
+    def commit(self, seconds):
+        # one writer transaction, seconds from begin to commit
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds * 1000 <= bound), len(LATENCY_BUCKETS))
+        with self.lock:
+            self.commit_ms[bucket] += 1
+            self.commits += 1
+            self.commit_seconds += seconds
+
+    def snapshot(self):
+        with self.lock:
+            state = {
+                'started_ms': self.started_ms,
+                'frames': dict(self.frames),
+                'parse_failures': dict(self.parse_failures),
+                'error_payloads': dict(self.error_payloads),
+                'reconnects': dict(self.reconnects),
+                'last_seen': dict(self.last_seen),
+                'commit_ms': dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['inf'], self.commit_ms)),
+                'commits': self.commits,
+                'commit_seconds': round(self.commit_seconds, 6),
+            }
+        state['queue_depth'] = self.queue_depth()
+        if self.writer is not None:
+            state['written'] = self.writer.written
+            state['dropped'] = self.writer.dropped
+        return state
+
+
+# === REPORTER ===
+def write_snapshot(conn, metrics, ts_ms=None):
+    ts_ms = to_epoch_ms(datetime.now()) if ts_ms is None else ts_ms
+    with conn:
+        conn.execute(SNAPSHOT_SQL, (ts_ms, json.dumps(metrics.snapshot(), separators=(',', ':'))))
+
+def metrics_loop(db_name, metrics, stop, interval=METRICS_INTERVAL):
+    """Collector thread: a snapshot every interval, until stop is set"""
+    conn = connect(db_name)
+    try:
+        while not stop.wait(interval):
+            try:
+                write_snapshot(conn, metrics)
+            except Exception as e:
+                log.error(f"Writing collector metrics failed: {e}")
+    finally:
+        conn.close()
+
+def start_metrics(metrics, db_name=DB_NAME, interval=METRICS_INTERVAL):
+    stop = threading.Event()
+    threading.Thread(target=metrics_loop, args=(db_name, metrics, stop, interval), name="metrics", daemon=True).start()
+    return stop
+
+
+# === READER ===
+def load_snapshots(conn, since_ms):
+    """[(ts_ms, state dict)] written since since_ms, oldest first"""
+    rows = conn.execute("SELECT ts_ms, state FROM collector_metrics WHERE ts_ms >= ? ORDER BY ts_ms", (since_ms,))
+    return [(ts_ms, json.loads(state)) for ts_ms, state in rows]
+
+def counter_delta(new, old, key):
+    # increase of a cumulative counter (a dict is summed) between two snapshots of the same run
+    def total(state):
+        value = state.get(key, 0)
+        return sum(value.values()) if isinstance(value, dict) else value
+    if old is None or old['started_ms'] != new['started_ms']:
+        return total(new)   # collector restarted, counters began at 0
+    return total(new) - total(old)
+
+def rates(snapshots, key='frames'):
+    """[(ts_ms, per second)] of a counter between consecutive snapshots"""
+    result = []
+    for (old_ms, old), (new_ms, new) in zip(snapshots, snapshots[1:]):
+        if new_ms > old_ms:
+            result.append((new_ms, counter_delta(new, old, key) * 1000 / (new_ms - old_ms)))
+    return result
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+from parquetArchive import load_range
+
+# (lower threshold, label, colour) per pollutant, ascending
+comfort_levels = {
+    "tvoc": [
+        (0, "Most Comfort", "#00FF00"),
+        (0.2, "Irritations and Discomfort", "#FFFF00"),
+        (3, "Headaches possible", "#FFA500"),
+        (25, "Neurotoxic", "#FF4500"),
+    ],
+    "co2": [
+        (0, "Most Comfort", "#00FF00"),
+        (1000, "Concentration problems", "#FFFF00"),
+        (2000, "Dangerous", "#FF4500")
+    ],
+    "pm_2_5": [
+        (0, "Most Comfort",  "#00FF00"),
+        (10, "Dangerous over a year", "#FFFF00"),
+        (25, "Dangerous within a day", "#FF4500"),
+    ],
+    "pm_10_0": [
+        (0, "Most Comfort", "#00FF00"),
+        (20, "Dangerous over a year", "#FFFF00"),
+        (50, "Dangerous within a day", "#FF4500")
+    ],
+    "humidex": [
+        (0, "Comfort", "#00FF00"),
+        (20, "Little Comfort", "#FFFF00"),
+        (30, "Some Discomfort", "#FFA500"),
+        (40, "Great Discomfort, avoid exertion", "#FF4500"),
+        (45, "Dangerous, heat strokes possible", "#8B0000")
+    ],
+}
+
+UNKNOWN = ("Unknown", "gray")
+MAX_GAP = 5 * 60 * 1000             # ms, a sample counts at most this long (longer gaps = no data)
+CHUNK_MS = 7 * 24 * 60 * 60 * 1000  # ms of readings loaded at once by time_in_band
+
+
+def comfort_index(pollutant, values):
+    """
+    Band of every value (index into comfort_levels[pollutant]) with one np.searchsorted over the
+    thresholds, -1 for unknown (NaN, negative, no levels).
+    """
+    values = np.asarray(values, dtype=float)
+    levels = comfort_levels.get(pollutant.lower())
+    if not levels:
+        return np.full(values.shape, -1)
+    edges = np.array([threshold for threshold, _, _ in levels], dtype=float)
+    index = np.searchsorted(edges, values, side='right') - 1     # last threshold <= value
+    return np.where(np.isnan(values) | (values < 0), -1, index)
+
+def comfort_labels(pollutant, values):
+    """Label of every value as pandas Categorical (categories in band order, plus Unknown)"""
+    return band_labels(pollutant, comfort_index(pollutant, values))
+
+def band_labels(pollutant, bands):
+    # bands as from comfort_index or the stored comfort_band column (NaN/None = unknown)
+    labels = [label for _, label, _ in comfort_levels.get(pollutant.lower(), [])] + [UNKNOWN[0]]
+    codes = pd.to_numeric(pd.Series(bands), errors='coerce').fillna(-1).to_numpy(dtype=int)
+    codes = np.where(codes < 0, len(labels) - 1, codes)
+    return pd.Categorical.from_codes(codes, categories=labels)
+
+def get_comfort_level(pollutant, value):
+    """(label, colour) of a single value"""
+    index = comfort_index(pollutant, [value])[0]
+    if index < 0:
+        return UNKNOWN
+    _, label, color = comfort_levels[pollutant.lower()][index]
+    return label, color
+
+
+def _bands(df, pollutant):
+    # the humidex band is stored with every reading (comfort_band)
+    if pollutant == "humidex":
+        return band_labels(pollutant, df["comfort_band"])
+    return comfort_labels(pollutant, df[pollutant])
+
+def time_in_band(conn, pollutants, start_ms, end_ms, period='D', gateway=None, chunk_ms=CHUNK_MS, max_gap=MAX_GAP):
+    """
+    Exposure summary: hours spent in each comfort band per pollutant and period
+    ('D', 'W', 'M', ... pandas period of the local timestamp) in [start_ms, end_ms).
+
+    Every reading counts until the next reading of the same gateway, at most max_gap.
+    Readings (SQLite and Parquet archive) are streamed in chunks of chunk_ms, so years of data
+    are summed in one pass with constant memory. Returns a DataFrame with the columns
+    period, pollutant, band and hours (bands in threshold order).
+    """
+    pollutants = [p for p in pollutants if p in comfort_levels]
+    metrics = sorted({"comfort_band" if p == "humidex" else p for p in pollutants})
+    totals = {}     # pollutant -> Series of hours by (period, band label)
+    carry = None    # last reading of every gateway, its duration is only known with the next chunk
+
+    for chunk_start in range(start_ms, end_ms, chunk_ms):
+        df = load_range(conn, chunk_start, min(chunk_start + chunk_ms, end_ms), metrics, gateway)
+        if carry is not None:
+            df = pd.concat([carry, df], ignore_index=True)
+        if df.empty:
+            continue
+        df = df.sort_values(['gateway', 'ts_ms'], kind='stable', na_position='first')
+        next_ts = df.groupby('gateway', dropna=False)['ts_ms'].shift(-1)
+        last = next_ts.isna()
+        carry = df[last]
+        df = df[~last]
+        if df.empty:
+            continue
+
+        hours = np.minimum(next_ts[~last].to_numpy() - df['ts_ms'].to_numpy(), max_gap) / 3600000
+        periods = df['timestamp'].dt.to_period(period)
+        for pollutant in pollutants:
+            bands = _bands(df, pollutant)
+            summed = pd.Series(hours).groupby([periods.to_numpy(), bands], observed=True).sum()
+            totals[pollutant] = summed if pollutant not in totals else totals[pollutant].add(summed, fill_value=0)
+
+    parts = []
+    for pollutant, summed in totals.items():
+        part = summed.astype(float).rename('hours').rename_axis(['period', 'band']).reset_index()
+        part.insert(1, 'pollutant', pollutant)
+        parts.append(part[part['hours'] > 0])
+    if not parts:
+        return pd.DataFrame(columns=['period', 'pollutant', 'band', 'hours'])
+    return pd.concat(parts, ignore_index=True).sort_values(['period', 'pollutant'], kind='stable').reset_index(drop=True)
@@ -0,0 +1,257 @@
+import logging
+import sqlite3
+import threading
+import time
+import pandas as pd
+import streamlit as st
+from datetime import datetime
+from alertEngine import load_active_alerts
+from collectorMetrics import load_snapshots
+from comfortLevels import time_in_band
+from onlineStats import load_window
+from rollupTables import query_history
+from sensorDatabase import DB_NAME, connect, to_epoch_ms
+
+log = logging.getLogger(__name__)
+
+CACHE_ROWS = 1000       # most recent readings kept in memory
+CHECK_INTERVAL = 1.0    # s, how often an open page checks for new readings
+FALLBACK_REFRESH = 60   # s, a page reruns at least this often (clock driven parts, missed changes)
+KALMAN_SAVE_INTERVAL = 60    # s, the Kalman checkpoints are written at most this often
+RANGE_REFRESH = 30      # s, range views rerun at most this often (one sender cycle)
+RANGE_ROUND_MS = RANGE_REFRESH * 1000  # range bounds are rounded up to this, so sessions share cached ranges
+
+
+# the shared connection is used from several session threads, queries go through this lock
+db_lock = threading.Lock()
+
+@st.cache_resource
+def get_connection():
+    # one connection for the whole Streamlit process, shared by all pages and sessions
+    return connect(DB_NAME, check_same_thread=False)
+
+def read_sql(query, params=(), **kwargs):
+    with db_lock:
+        return pd.read_sql_query(query, get_connection(), params=params, **kwargs)
+
+
+class ChangeMonitor:
+    """
+    Newest reading id, shared by all sessions. PRAGMA data_version of the shared connection only
+    changes when another connection (the collector) committed, so the id is re-read just then
+    and a check without new data costs no page read.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data_version = None
+        self.last_id = None
+
+    def latest_id(self):
+        with self.lock, db_lock:
+            conn = get_connection()
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self.data_version:
+                self.data_version = version
+                self.last_id = conn.execute("SELECT MAX(id) FROM readings").fetchone()[0]
+            return self.last_id
+
+
+@st.cache_resource
+def get_change_monitor():
+    return ChangeMonitor()
+
+
+@st.fragment(run_every=CHECK_INTERVAL)
+def _watch_readings():
+    # only this fragment runs every CHECK_INTERVAL, the page itself only when there is something new
+    state = st.session_state
+    since = time.monotonic() - state.get('last_page_run', 0.0)
+    if since < state.get('min_rerun', 0.0):
+        return
+    if get_change_monitor().latest_id() != state.get('seen_reading_id') or since >= FALLBACK_REFRESH:
+        st.rerun()
+
+def auto_refresh(min_interval=0.0):
+    """
+    Change-driven replacement of st_autorefresh: the page is rerun when the collector wrote
+    new readings, and at least every FALLBACK_REFRESH seconds.
+    min_interval: seconds between two reruns at least (RANGE_REFRESH for range views, whose
+    queries and filters are too expensive to repeat on every commit).
+    """
+    st.session_state['seen_reading_id'] = get_change_monitor().latest_id()
+    st.session_state['last_page_run'] = time.monotonic()
+    st.session_state['min_rerun'] = min_interval
+    _watch_readings()
+
+
+class ReadingsCache:
+    """
+    In-process cache of the most recent rows of sensor_readings.
+    refresh() only fetches rows with an id above the last one seen, and only when the change
+    monitor reports a newer id, so every page rerun of every session is served from memory and
+    the database sees one small query per commit. A rerun triggered by a new id (auto_refresh)
+    always gets that reading, there is no time based throttle that could hold it back.
+    """
+
+    def __init__(self, max_rows=CACHE_ROWS):
+        self.max_rows = max_rows
+        self.lock = threading.Lock()
+        self.df = pd.DataFrame()
+        self.last_id = None
+
+    def refresh(self):
+        with self.lock:
+            if self.last_id is not None and get_change_monitor().latest_id() == self.last_id:
+                return  # nothing new written
+
+            if self.last_id is None:
+                # first load: newest max_rows rows
+                new = read_sql(
+                    "SELECT * FROM sensor_readings ORDER BY ts_ms DESC LIMIT ?",
+                    (self.max_rows,), parse_dates=['timestamp']
+                )
+            else:
+                new = read_sql(
+                    "SELECT * FROM sensor_readings WHERE id > ? ORDER BY id",
+                    (self.last_id,), parse_dates=['timestamp']
+                )
+            if new.empty:
+                if self.last_id is None:
+                    self.last_id = 0
+                return
+
+            df = new if self.df.empty else pd.concat([self.df, new], ignore_index=True)
+            self.df = df.sort_values('ts_ms').tail(self.max_rows).reset_index(drop=True)
+            self.last_id = max(self.last_id or 0, int(new['id'].max()))
+
+    def latest(self, n=100):
+        """Newest n readings, newest first (same order as ORDER BY ts_ms DESC LIMIT n)"""
+        self.refresh()
+        with self.lock:
+            return self.df.tail(n).iloc[::-1].reset_index(drop=True)
+
+
+@st.cache_resource
+def get_readings_cache():
+    return ReadingsCache()
+
+
+def get_latest_readings(n=100):
+    return get_readings_cache().latest(n)
+
+def get_gateways():
+    """Gateways with readings in the database, sorted (skip scan over idx_readings_gateway_ts_ms)"""
+    df = read_sql('''
+        WITH RECURSIVE gateways(gateway) AS (
+            SELECT MIN(gateway) FROM readings
+            UNION ALL
+            SELECT (SELECT MIN(gateway) FROM readings WHERE gateway > gateways.gateway)
+            FROM gateways WHERE gateway IS NOT NULL
+        )
+        SELECT gateway FROM gateways WHERE gateway IS NOT NULL
+    ''')
+    return list(df['gateway'])
+
+def _gateway_selectbox(gateways):
+    # only shown when there is something to choose
+    if len(gateways) < 2:
+        return gateways[0] if gateways else None
+    return st.sidebar.selectbox("Gateway", gateways)
+
+def select_gateway(df):
+    """
+    Sidebar filter for the gateway (receiver) of the readings, only shown when df holds
+    readings of more than one gateway. Returns (filtered df, selected gateway or None).
+    """
+    if df.empty or 'gateway' not in df.columns:
+        return df, None
+    gateway = _gateway_selectbox(sorted(df['gateway'].dropna().unique()))
+    if gateway is None:
+        return df, None
+    return df[df['gateway'] == gateway].reset_index(drop=True), gateway
+
+def select_range_gateway():
+    """
+    Sidebar filter of the range views, all gateways stored in the database.
+    Returns (selected gateway or None, number of gateways).
+    """
+    gateways = get_gateways()
+    return _gateway_selectbox(gateways), len(gateways)
+
+@st.cache_data(ttl=RANGE_REFRESH, max_entries=4)
+def _cached_range(metrics, start_ms, end_ms, max_points, gateway):
+    # own connection, the Parquet reads of archived days do not hold up db_lock
+    conn = connect(DB_NAME)
+    try:
+        return query_history(conn, list(metrics), start_ms, end_ms, max_points, gateway)
+    finally:
+        conn.close()
+
+def get_range(metrics, start_ms, end_ms, max_points=1500, gateway=None):
+    """
+    Metrics in [start_ms, end_ms) (indexed ts_ms range query), from raw readings or the rollup
+    tables depending on the span. Returns (resolution, DataFrame), see rollupTables.query_history.
+    gateway filters raw readings, rollups (resolution not None) cover all gateways.
+    Cached for all sessions by range, bounds rounded up to RANGE_ROUND_MS: a sliding range gets
+    one new entry per RANGE_REFRESH, entries expire after it (fixed ranges that end later).
+    """
+    start_ms, end_ms = (-(-bound // RANGE_ROUND_MS) * RANGE_ROUND_MS for bound in (start_ms, end_ms))
+    return _cached_range(tuple(metrics), start_ms, end_ms, max_points, gateway)
+
+def get_history(metrics, span_ms, max_points=1500, gateway=None):
+    # last span_ms up to now
+    end_ms = to_epoch_ms(datetime.now())
+    return get_range(metrics, end_ms - span_ms, end_ms, max_points, gateway)
+
+def load_kalman_state(kalman):
+    # continue an incremental Kalman filter from the checkpoints of the last page server run
+    with db_lock:
+        kalman.load(get_connection())
+    return kalman
+
+def save_kalman_state(kalman, interval=KALMAN_SAVE_INTERVAL):
+    """Persist the Kalman checkpoints, at most every interval seconds"""
+    if time.monotonic() - kalman.saved_at < interval:
+        return
+    try:
+        with db_lock:
+            kalman.save(get_connection())
+    except sqlite3.OperationalError as e:
+        kalman.saved_at = time.monotonic()    # tried again after interval
+        log.warning(f"Saving the Kalman state failed: {e}")
+
+def get_online_stats(window):
+    """Running statistics of a window ('hour', 'day', 'all') as kept by the collector"""
+    with db_lock:
+        return load_window(get_connection(), window, to_epoch_ms(datetime.now()))
+
+@st.cache_data(ttl=600)
+def get_time_in_band(pollutants, start_ms, end_ms, period='D', gateway=None):
+    """
+    Hours per comfort band, pollutant and period (see comfortLevels.time_in_band), cached 10 min.
+    The scan runs on its own connection (WAL readers do not block each other), so the other
+    queries of all sessions are not held up by db_lock meanwhile.
+    """
+    conn = connect(DB_NAME)
+    try:
+        return time_in_band(conn, list(pollutants), start_ms, end_ms, period, gateway)
+    finally:
+        conn.close()
+
+def get_active_alerts():
+    """Alerts raised by the collector and not cleared yet: DataFrame gateway, metric, ts_ms, value, threshold"""
+    with db_lock:
+        rows = load_active_alerts(get_connection())
+    return pd.DataFrame(rows, columns=['gateway', 'metric', 'ts_ms', 'value', 'threshold'])
+
+def get_collector_snapshots(span_ms=60 * 60 * 1000):
+    """Collector metric snapshots of the last span_ms, [(ts_ms, state)] oldest first"""
+    with db_lock:
+        return load_snapshots(get_connection(), to_epoch_ms(datetime.now()) - span_ms)
+
+def get_alert_events(limit=50):
+    # newest alert events first
+    return read_sql(
+        "SELECT ts_ms, gateway, metric, event, value, threshold FROM alerts ORDER BY id DESC LIMIT ?", (limit,)
+    )
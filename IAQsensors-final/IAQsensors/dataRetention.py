@@ -0,0 +1,111 @@
+import argparse
+import logging
+import threading
+import time
+from datetime import datetime
+from collectorLog import setup_logging
+from parquetArchive import archive_days, pa
+from sensorDatabase import DAY_MS, DB_NAME, connect, delete_batched, init_db, to_epoch_ms
+
+log = logging.getLogger(__name__)
+
+# === CONFIGURATION ===
+# table -> (time column, row key, days kept); None keeps everything
+RETENTION = {
+    'readings': ('ts_ms', 'id', 30),
+    'rollup_1m': ('bucket_ms', '(metric, bucket_ms)', 90),
+    'rollup_1h': ('bucket_ms', '(metric, bucket_ms)', 2 * 365),
+    'rollup_1d': ('bucket_ms', '(metric, bucket_ms)', None),
+    'alerts': ('ts_ms', 'id', 365),
+    'collector_metrics': ('ts_ms', 'ts_ms', 2),
+}
+VACUUM_BUDGET = 0.5         # s, longest incremental_vacuum slice
+VACUUM_PAGES = 256          # pages freed per incremental_vacuum step
+MAINTENANCE_INTERVAL = 3600 # s, retention run of the collector
+
+
+def apply_retention(conn, retention=RETENTION, now_ms=None):
+    """Delete rows older than their table's retention in small batches, returns {table: deleted rows}"""
+    now_ms = to_epoch_ms(datetime.now()) if now_ms is None else now_ms
+    deleted = {}
+    for table, (column, key, days) in retention.items():
+        if days is None:
+            continue
+        deleted[table] = delete_batched(conn, table, f"{column} < ?", (now_ms - days * DAY_MS,), key=key)
+    return deleted
+
+def incremental_vacuum(conn, budget=VACUUM_BUDGET, pages=VACUUM_PAGES):
+    """
+    Give free pages back to the file system in slices of pages, for at most budget seconds
+    (each slice is a short write transaction). Returns the number of free pages left.
+    """
+    deadline = time.monotonic() + budget
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    while free and time.monotonic() < deadline:
+        conn.execute(f"PRAGMA incremental_vacuum({pages})").fetchall()
+        conn.commit()
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # the file only shrinks once the WAL is checkpointed, PASSIVE never waits for readers
+    conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+    return free
+
+def archive_old_days(conn):
+    """
+    Move closed days older than parquetArchive.HOT_DAYS to the Parquet archive, so readings
+    reach their retention only after they were archived. Without pyarrow nothing is archived
+    and the readings retention deletes them. Returns the number of archived rows.
+    """
+    if pa is None:
+        return 0
+    return archive_days(conn)
+
+def run_maintenance(conn, retention=RETENTION, budget=VACUUM_BUDGET):
+    archived = archive_old_days(conn)
+    deleted = apply_retention(conn, retention)
+    free = incremental_vacuum(conn, budget)
+    if archived:
+        log.info(f"Archive: {archived} rows moved to Parquet")
+    if any(deleted.values()):
+        log.info("Retention: " + ", ".join(f"{table} {count} rows" for table, count in deleted.items() if count)
+                 + f" deleted, {free} free pages left")
+
+def maintenance_loop(db_name, stop, interval=MAINTENANCE_INTERVAL):
+    """Collector thread: archive, retention and a vacuum slice every interval, until stop is set"""
+    conn = connect(db_name)
+    try:
+        while not stop.wait(interval):
+            try:
+                run_maintenance(conn)
+            except Exception as e:
+                log.error(f"Maintenance failed: {e}")
+    finally:
+        conn.close()
+
+def start_maintenance(db_name=DB_NAME, interval=MAINTENANCE_INTERVAL):
+    stop = threading.Event()
+    threading.Thread(target=maintenance_loop, args=(db_name, stop, interval), name="maintenance", daemon=True).start()
+    return stop
+
+
+# === MAIN ===
+def main():
+    parser = argparse.ArgumentParser(description="Archive and delete old rows and compact sensor_data.db")
+    parser.add_argument("--db", default=DB_NAME, help="database (default: sensor_data.db)")
+    for table, (_, _, days) in RETENTION.items():
+        parser.add_argument(f"--{table.replace('_', '-')}-days", dest=table, type=int, default=days,
+                            help=f"days of {table} kept (default: {days or 'all'}, 0 = all)")
+    parser.add_argument("--budget", type=float, default=VACUUM_BUDGET, help="seconds of incremental vacuum")
+    args = parser.parse_args()
+
+    retention = {table: (column, key, getattr(args, table) or None) for table, (column, key, _) in RETENTION.items()}
+    setup_logging(None)
+    conn = connect(args.db)
+    init_db(conn)
+    print("Archived rows:", archive_old_days(conn))
+    print("Deleted rows:", apply_retention(conn, retention))
+    print("Free pages left:", incremental_vacuum(conn, args.budget))
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
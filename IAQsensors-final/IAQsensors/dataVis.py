@@ -1,27 +1,44 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
-from streamlit_autorefresh import st_autorefresh
-from calculateIndeces import calculate_humidex_series
-from kalmanFilter import kalman_filter
+from dataAccess import RANGE_REFRESH, auto_refresh, get_active_alerts, get_alert_events, get_history, get_latest_readings, select_gateway, select_range_gateway
+from comfortLevels import band_labels, comfort_labels
+from sensorDatabase import to_local_time
 import plotly.express as px
 
 
 st.set_page_config(page_title="Live Sensor Dashboard", layout="wide")
 st.title("Live Sensor Data Dashboard")
 
-# Auto-refresh every 5 seconds based on incoming data
-st_autorefresh(interval=5000, key="data_refresh")
+# Expected pollutant list
+pollutants = [
+    'co2', 'temperature', 'humidity', 'tvoc', 'eco2',
+    'pm_0_5', 'pm_1_0', 'pm_2_5', 'pm_4_0', 'pm_10_0',
+    'pm_1_0_nc', 'pm_2_5_nc', 'pm_4_0_nc', 'pm_10_0_nc',
+    'typical_particle_size'
+]
 
-# Connect to the SQLite database
-conn = sqlite3.connect("sensor_data.db", check_same_thread=False)
+# Live: latest N entries, longer ranges come from the rollup tables (mean per bucket)
+time_ranges = {
+    "Live (last 100 readings)": None,
+    "Last hour": 60 * 60 * 1000,
+    "Last day": 24 * 60 * 60 * 1000,
+    "Last week": 7 * 24 * 60 * 60 * 1000,
+}
+time_range = st.selectbox("Time range", list(time_ranges))
+live = time_ranges[time_range] is None
 
-# Read latest N entries
-df = pd.read_sql_query(
-    "SELECT * FROM sensor_readings ORDER BY timestamp DESC LIMIT 100",
-    conn,
-    parse_dates=['timestamp']
-)
+# Rerun when the collector wrote new readings (checked every second, fallback every minute),
+# range views at most every RANGE_REFRESH seconds
+auto_refresh(0 if live else RANGE_REFRESH)
+
+if live:
+    # Read latest N entries (shared cache, only new rows are fetched from the database)
+    df, gateway = select_gateway(get_latest_readings(100))
+else:
+    gateway, gateway_count = select_range_gateway()
+    resolution, df = get_history(pollutants + ['humidex'], time_ranges[time_range], gateway=gateway)
+    if resolution is not None and gateway_count > 1:
+        st.caption("Aggregated over all gateways (rollups are not kept per gateway)")
 
 if not df.empty:
     df['timestamp'] = pd.to_datetime(df['timestamp']) #ensure timestamp is in datetime format
@@ -31,23 +48,10 @@ if not df.empty:
 else:
     print("No data available in the database.")
 
-
-# Expected pollutant list
-pollutants = [
-    'co2', 'temperature', 'humidity', 'tvoc', 'eco2',
-    'pm_0_5', 'pm_1_0', 'pm_2_5', 'pm_4_0', 'pm_10_0',
-    'pm_1_0_nc', 'pm_2_5_nc', 'pm_4_0_nc', 'pm_10_0_nc',
-    'typical_particle_size'
-]
-
-# Define thresholds for pollutants (add or adjust as needed)
-thresholds = {
-    'co2': 1000,    # ppm
-    'tvoc': 56,     # ppb
-    'eco2': 1000,   # ppm
-    'pm_2_5': 25,   # µg/m³
-    'pm_10_0': 50,  # µg/m³
-}
+# Alerts are raised by the collector (rolling mean, hysteresis, hold-off, see alertEngine.ALERT_RULES)
+alerts = get_active_alerts()
+if gateway is not None and not alerts.empty:
+    alerts = alerts[alerts['gateway'] == gateway]
 
 # Check which pollutants are available in the DataFrame
 available = [p for p in pollutants if p in df.columns]
@@ -58,17 +62,20 @@ if not df.empty:
     cols = st.columns(3)    #display in twhree columns
 
     #time for x-axis
-    df['time'] = df['timestamp'].dt.strftime('%H:%M:%S')  
+    df['time'] = df['timestamp'].dt.strftime('%H:%M:%S' if live else '%m-%d %H:%M')
 
     for i, pollutant in enumerate(available):
         with cols[i % 3]:
-            st.markdown(f"**{pollutant.upper()} (with 1-min moving average)**")
+            st.markdown(f"**{pollutant.upper()} (with {'1-min moving' if live else 'bucket'} average)**")
 
-            #Calculate rolling mean (1 minute window)
-            rolling_mean = df[pollutant].rolling(30,1).mean()   #30 samples for 1 minute at s intervals 
+            if live:
+                #Calculate rolling mean (1 minute window)
+                rolling_mean = df[pollutant].rolling(30,1).mean()   #30 samples for 1 minute at s intervals 
+            else:
+                rolling_mean = df[pollutant]    # rollup buckets are already averaged
 
-            if pollutant in thresholds and rolling_mean.iloc[-1] > thresholds.get(pollutant):
-                st.warning(f"⚠️ {pollutant.upper()} exceeds threshold: {thresholds.get(pollutant)}")
+            for _, alert in alerts[alerts['metric'] == pollutant].iterrows():
+                st.warning(f"⚠️ {pollutant.upper()} exceeds threshold: {alert['threshold']:g}")
                 
             #combine original and smoothed data
             chart_df = pd.DataFrame({
@@ -80,17 +87,19 @@ if not df.empty:
             # Plot the data
             st.line_chart(chart_df, use_container_width=True)
 
-    #Display Humidex Comfort Category
-    df["humidex_category"] = calculate_humidex_series(df["temperature"], df["humidity"])  
+    #Display Humidex Comfort Category (humidex and band are stored with every reading)
     humidex_cat_df = pd.DataFrame({
         "time": df["time"],
-        "Humidex Category": df["humidex_category"]
+        "Humidex": df["humidex"],
+        # buckets only have the mean humidex, its band is looked up here
+        "Humidex Category": band_labels("humidex", df["comfort_band"]) if "comfort_band" in df.columns
+                            else comfort_labels("humidex", df["humidex"]),
     })
 
     fig = px.line(
         humidex_cat_df,
         x="time",
-        y="Humidex Category",
+        y="Humidex",
         color="Humidex Category",
         title="Humidex Comfort Category Over Time"
     )
@@ -100,4 +109,13 @@ if not df.empty:
 else:
     st.warning("No data available.")
 
+# Alert history written by the collector
+with st.expander("Recent alerts"):
+    events = get_alert_events(50)
+    if events.empty:
+        st.info("No alerts so far.")
+    else:
+        events['time'] = to_local_time(events['ts_ms'])
+        st.dataframe(events[['time', 'gateway', 'metric', 'event', 'value', 'threshold']], use_container_width=True)
+
 #
\ No newline at end of file
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+from calculateIndeces import calculate_humidex_series
+from comfortLevels import comfort_index
+from sensorDatabase import BACKFILL_CHUNK, DERIVED, ROW_COLUMNS
+
+# Magnus formula coefficients over water (Sonntag 1990)
+MAGNUS_A = 17.62
+MAGNUS_B = 243.12   # °C
+
+
+# === DERIVED METRICS ===
+# all functions take and return numpy arrays (NaN = missing), so the writer computes a whole
+# batch and the backfill a whole chunk at once
+def humidex(temperature, humidity):
+    # same values as on the pages before (calculateIndeces, rounded to 0.1)
+    return calculate_humidex_series(pd.Series(temperature), pd.Series(humidity)).to_numpy()
+
+def dew_point(temperature, humidity):
+    """Dew point in °C"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gamma = np.log(humidity / 100) + MAGNUS_A * temperature / (MAGNUS_B + temperature)
+        return np.round(MAGNUS_B * gamma / (MAGNUS_A - gamma), 1)
+
+def absolute_humidity(temperature, humidity):
+    """Water vapour in g/m³"""
+    vapour_pressure = 6.112 * np.exp(MAGNUS_A * temperature / (MAGNUS_B + temperature)) * humidity / 100    # hPa
+    return np.round(216.7 * vapour_pressure / (273.15 + temperature), 2)
+
+def humidex_band(humidex):
+    # index into comfortLevels.comfort_levels['humidex'], NaN for unknown
+    index = comfort_index('humidex', humidex)
+    return np.where(index < 0, np.nan, index)
+
+# column -> (inputs, function), in dependency order (a function may use columns derived before it).
+# A new derived metric needs an entry here and a column in sensorDatabase.DERIVED (plus a migration).
+DERIVED_METRICS = {
+    'humidex': (('temperature', 'humidity'), humidex),
+    'dew_point': (('temperature', 'humidity'), dew_point),
+    'absolute_humidity': (('temperature', 'humidity'), absolute_humidity),
+    'comfort_band': (('humidex',), humidex_band),
+}
+INPUTS = sorted({name for inputs, _ in DERIVED_METRICS.values() for name in inputs if name not in DERIVED_METRICS})
+
+
+def derive(values):
+    """values: input column -> float array. Returns derived column -> float array (NaN = missing)"""
+    columns = dict(values)
+    for column, (inputs, func) in DERIVED_METRICS.items():
+        columns[column] = np.asarray(func(*(columns[name] for name in inputs)), dtype=float)
+    return {column: columns[column] for column in DERIVED_METRICS}
+
+def _to_sql(value, column):
+    if value != value or np.isinf(value):
+        return None
+    return int(value) if column == 'comfort_band' else float(value)
+
+def add_derived(rows):
+    """Ingest stage: fill the DERIVED slots of a batch of rows (reading_row layout) in place"""
+    if not rows:
+        return rows
+    values = {
+        name: np.array([v if isinstance(v, (int, float)) else np.nan for v in (row[ROW_COLUMNS.index(name)] for row in rows)],
+                       dtype=float)
+        for name in INPUTS
+    }
+    for column, result in derive(values).items():
+        i = ROW_COLUMNS.index(column)
+        for row, value in zip(rows, result.tolist()):
+            row[i] = _to_sql(value, column)
+    return rows
+
+
+# === BACKFILL ===
+def derive_frame(df):
+    # DataFrame with the INPUTS columns -> the same DataFrame with the DERIVED columns set
+    derived = derive({name: df[name].to_numpy(dtype=float) for name in INPUTS})
+    for column, result in derived.items():
+        df[column] = result
+    return df
+
+def backfill_derived(conn, chunk=BACKFILL_CHUNK):
+    """Compute the derived columns of stored readings in chunks of rows, one commit per chunk"""
+    last_id = 0
+    updated = 0
+    while True:
+        df = pd.read_sql_query(
+            f"SELECT id, {', '.join(INPUTS)} FROM readings WHERE id > ? ORDER BY id LIMIT ?",
+            conn, params=(last_id, chunk)
+        )
+        if df.empty:
+            break
+        derive_frame(df)
+        updates = [[_to_sql(value, column) for column, value in zip(DERIVED, values)] + [row_id]
+                   for row_id, values in zip(df['id'].tolist(), df[DERIVED].to_numpy().tolist())]
+        conn.executemany(f"UPDATE readings SET {', '.join(f'{c} = ?' for c in DERIVED)} WHERE id = ?", updates)
+        conn.commit()
+        updated += len(df)
+        last_id = int(df['id'].iloc[-1])
+    return updated
+
+def backfill_archive(archive_dir=None):
+    """Add the derived columns to day partitions archived before they existed"""
+    from parquetArchive import ARCHIVE_DIR, _write_day, archive_schema, archived_days, day_path, pq
+    archive_dir = archive_dir or ARCHIVE_DIR
+    days = archived_days(archive_dir)
+    rewritten = 0
+    if pq is None:
+        return rewritten
+    for day in days:
+        path = day_path(day, archive_dir)
+        df = pq.read_table(path, schema=archive_schema()).to_pandas()
+        if df[DERIVED].notna().any().any():
+            continue
+        _write_day(derive_frame(df), path)
+        rewritten += 1
+    return rewritten
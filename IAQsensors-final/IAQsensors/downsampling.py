@@ -0,0 +1,59 @@
+import warnings
+import numpy as np
+
+PIXEL_BUDGET = 800  # points per series sent to the browser
+
+
+def lttb_indices(x, y, n_out=PIXEL_BUDGET):
+    """
+    Largest-Triangle-Three-Buckets downsampling, vectorized over channels.
+
+    Parameters:
+    x: np.array (n,) of increasing x values (e.g. ts_ms)
+    y: np.array (n,) or (n, channels), NaN points are never selected unless a bucket has no other
+    n_out: number of points to keep per channel (first and last point are always kept)
+
+    Returns:
+    np.array (n_out,) or (n_out, channels) of selected row indices, increasing per channel.
+    The loop runs once per bucket for all channels together, so 15 pollutants cost about
+    the same as one.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    one_channel = y.ndim == 1
+    y = y[:, None] if one_channel else y
+    n, channels = y.shape
+
+    if n <= n_out or n_out < 3:
+        indices = np.repeat(np.arange(n)[:, None], channels, axis=1)
+        return indices[:, 0] if one_channel else indices
+
+    # n_out - 2 buckets between the fixed first and last point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    channel = np.arange(channels)
+    indices = np.empty((n_out, channels), dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+    selected = np.zeros(channels, dtype=int)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)    # all-NaN buckets
+        for b in range(n_out - 2):
+            lo, hi = edges[b], edges[b + 1]
+            next_lo = hi
+            next_hi = edges[b + 2] if b + 2 < len(edges) else n
+
+            # third triangle point: average of the next bucket
+            avg_x = x[next_lo:next_hi].mean()
+            avg_y = np.nanmean(y[next_lo:next_hi], axis=0)
+
+            # first triangle point: the point selected in the previous bucket
+            ax = x[selected]
+            ay = y[selected, channel]
+
+            area = np.abs((ax - avg_x) * (y[lo:hi] - ay) - (ax - x[lo:hi, None]) * (avg_y - ay))
+            area = np.where(np.isnan(area), -1.0, area)
+            selected = lo + area.argmax(axis=0)
+            indices[b + 1] = selected
+
+    return indices[:, 0] if one_channel else indices
@@ -1,24 +1,168 @@
 from serial.tools import list_ports
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import logging
+import os
 import serial
+import threading
 import time
 
-def find_active_port():
-    expected_keywords = ["co2", "temperature", "humidity", "tvoc", "pm"]  # Expected keys in sensor data
-    ports = list_ports.comports()
-
-    for port in ports:
-        try: 
-            print(f"Trying port: {port.device}")
-            with serial.Serial(port.device, baudrate=115200, timeout=1) as ser:
-                time.sleep(2)  # Wait for the port to initialize
-                for _ in range(10): #read attempts to go through multiple lines 
-                    line = ser.readline().decode(errors='ignore').strip()
-                    if not line:
-                        continue
-                    if any(keyword in line for keyword in expected_keywords):
-                        print(f"Active port found: {port.device}")
-                        return port.device
-        except Exception as e:
-            print(f"Failed to read from port {port.device}: {e}")
-            continue
-    return None  
+log = logging.getLogger(__name__)
+
+EXPECTED_KEYWORDS = ["co2", "temperature", "humidity", "tvoc", "pm"]  # Expected keys in sensor data
+SEND_INTERVAL = 30      # s, the sender reports every 30 s, the receiver forwards right away
+PROBE_TIMEOUT = SEND_INTERVAL + 10  # s, longest wait for sensor data on a port (one send cycle plus margin)
+IGNORE_RETRY = 5 * 60   # s, a port probed without sensor data is probed again after this
+PORT_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "port_cache.json")
+
+def port_identity(port):
+    # stable across re-plugging, unlike the device name (ttyACM0 -> ttyACM1)
+    return {"vid": port.vid, "pid": port.pid, "serial_number": port.serial_number}
+
+def gateway_id(device):
+    """
+    Gateway name readings of device are tagged with: "vid:pid:serial" of its USB port, stable
+    across re-plugging and restarts. Other devices (e.g. the pty of a replay) keep their name.
+    """
+    for port in usb_ports():
+        if port.device == device:
+            # identical dongles without serial number are told apart by their USB location
+            return f"{port.vid:04x}:{port.pid:04x}:{port.serial_number or port.location or device}"
+    return device
+
+def usb_ports():
+    # only USB serial devices can be a receiver dongle, skips the many built-in ttyS* ports
+    return [port for port in list_ports.comports() if port.vid is not None]
+
+def load_port_cache(path=PORT_CACHE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+def remember_port(port, path=PORT_CACHE):
+    cached = load_port_cache(path)
+    if port_identity(port) not in cached:
+        cached.append(port_identity(port))
+        save_identities(cached, path)
+
+def save_identities(identities, path=PORT_CACHE):
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(identities, f, indent=2)
+    except OSError as e:
+        log.warning(f"Could not write port cache {path}: {e}")
+
+def probe_port(device, expected_keywords=EXPECTED_KEYWORDS, timeout=PROBE_TIMEOUT, stop=None):
+    """Read from device until sensor data shows up (True), timeout passed or stop is set (False)"""
+    try:
+        log.info(f"Trying port: {device}")
+        with serial.Serial(device, baudrate=115200, timeout=0.2) as ser:
+            deadline = time.monotonic() + timeout
+            received = ""
+            while time.monotonic() < deadline and not (stop and stop.is_set()):
+                data = ser.read(ser.in_waiting or 1).decode(errors='ignore')
+                if not data:
+                    continue
+                received = (received + data)[-256:]  # keywords may be split over reads
+                if any(keyword in received for keyword in expected_keywords):
+                    log.info(f"Active port found: {device}")
+                    return True
+    except Exception as e:
+        log.warning(f"Failed to read from port {device}: {e}")
+    return False
+
+def find_active_ports(use_cache=True):
+    """
+    Ports with a receiver sending sensor data, returned as soon as the first one is found.
+    Ports matching the cache (VID/PID/serial number of the last good ports) are taken right away,
+    otherwise all USB ports are probed concurrently. Probes still running then are stopped (the
+    ports are closed), the PortWatcher probes them again and attaches further receivers.
+    Found ports are added to the cache.
+    """
+    ports = usb_ports()
+    if use_cache:
+        cached = load_port_cache()
+        found = [port for port in ports if port_identity(port) in cached]
+        if found:
+            log.info("Using cached port(s): " + ", ".join(port.device for port in found))
+            return [port.device for port in found]
+
+    if not ports:
+        return []
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=len(ports))
+    try:
+        probes = {pool.submit(probe_port, port.device, stop=stop): port for port in ports}
+        for probe in as_completed(probes):
+            if probe.result():
+                # ports whose probe matched meanwhile come along
+                found = [port for future, port in probes.items() if future.done() and future.result()]
+                for port in found:
+                    remember_port(port)
+                return [port.device for port in found]
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+    return []
+
+
+class PortWatcher:
+    """
+    Hot-plug watcher: polls the USB serial ports and calls on_attach(device) when a receiver
+    appears (cached identity, or a background probe found sensor data) and on_detach(device)
+    when a watched port disappears. run() blocks, use it from the collector's main thread.
+    """
+
+    def __init__(self, on_attach, on_detach, active=(), poll_interval=1.0):
+        self.on_attach = on_attach
+        self.on_detach = on_detach
+        self.poll_interval = poll_interval
+        self.active = set(active)   # attached devices
+        self.probing = set()        # devices with a running probe
+        self.ignored = {}           # device -> monotonic time it was probed without sensor data,
+                                    # probed again after IGNORE_RETRY or re-plugging
+        self.lock = threading.Lock()
+
+    def _probe(self, port):
+        active = probe_port(port.device)
+        with self.lock:
+            self.probing.discard(port.device)
+            if not active:
+                self.ignored[port.device] = time.monotonic()
+                return
+            self.active.add(port.device)
+        remember_port(port)
+        self.on_attach(port.device)
+
+    def poll(self):
+        ports = {port.device: port for port in usb_ports()}
+        cached = load_port_cache()
+        with self.lock:
+            for device in list(self.active):
+                if device not in ports:
+                    log.warning(f"Port disconnected: {device}")
+                    self.active.discard(device)
+                    self.on_detach(device)
+            now = time.monotonic()
+            self.ignored = {device: since for device, since in self.ignored.items()
+                            if device in ports and now - since < IGNORE_RETRY}
+            new = [port for device, port in ports.items()
+                   if device not in self.active and device not in self.probing and device not in self.ignored]
+
+        for port in new:
+            if port_identity(port) in cached:
+                log.info(f"Known port connected: {port.device}")
+                with self.lock:
+                    self.active.add(port.device)
+                self.on_attach(port.device)
+            else:
+                with self.lock:
+                    self.probing.add(port.device)
+                threading.Thread(target=self._probe, args=(port,), daemon=True).start()
+
+    def run(self):
+        while True:
+            self.poll()
+            time.sleep(self.poll_interval)
@@ -0,0 +1,119 @@
+import logging
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+MAX_FRAME_SIZE = 4096  # bytes, larger frames are dropped (receiver TEXTBUFFER is far smaller)
+
+
+def decode_frame(data):
+    # the sender's firmware writes µ (units) as a single latin-1 byte, which is no valid UTF-8
+    try:
+        return bytes(data).decode("utf-8")
+    except UnicodeDecodeError:
+        return bytes(data).decode("latin-1")
+
+
+def _find(data, byte, pos):
+    # position of the next byte at or after pos, len(data) if there is none
+    at = data.find(byte, pos)
+    return len(data) if at < 0 else at
+
+
+class FrameReader:
+    """
+    Incremental reader that cuts whole { ... } JSON objects out of a serial byte stream.
+
+    The receiver printk's every CoAP payload (the sender's json_buf) without any framing,
+    so objects can be split over several reads or several objects can arrive in one read.
+    Bytes are buffered until the matching closing brace arrives. Text outside of an object
+    (e.g. "Delivery confirmed.") is skipped. Braces inside quoted strings are ignored.
+    """
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def reset(self):
+        self.buffer.clear()
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, data):
+        """Feed raw bytes, returns list of complete frames (decoded str) found so far."""
+        # Only braces and backslashes are visited one by one (bytes.find, in C): whether one lies
+        # inside a string follows from the parity of the quotes before it (bytes.count).
+        data = bytes(data)
+        frames = []
+        n = len(data)
+        find = data.find
+        pos = 0         # next byte of data to scan
+        start = 0       # first byte of the current frame in data (earlier bytes are in buffer)
+        open_at = close_at = escape_at = -1     # next '{', '}' and '\\', refreshed once passed
+        while pos < n:
+            if self.depth == 0:     # skip everything before the start of the next object
+                pos = find(b'{', pos)
+                if pos < 0:
+                    return frames
+                start = pos
+                pos += 1
+                self.depth = 1
+                continue
+            if self.escaped:        # escaped byte of a string, taken as is
+                self.escaped = False
+                pos += 1
+                continue
+
+            if open_at < pos:
+                open_at = _find(data, b'{', pos)
+            if close_at < pos:
+                close_at = _find(data, b'}', pos)
+            if escape_at < pos:
+                escape_at = _find(data, b'\\', pos)
+            at = min(open_at, close_at, escape_at)
+
+            size = len(self.buffer) + min(at + 1, n) - start
+            if size > self.max_frame_size:
+                log.warning(f"Dropping oversized frame (over {self.max_frame_size} bytes)")
+                pos = max(pos, start + self.max_frame_size - len(self.buffer))
+                self.reset()
+                continue
+
+            if data.count(b'"', pos, at) % 2:
+                self.in_string = not self.in_string
+            if at == n:
+                break
+            pos = at + 1
+            if self.in_string:
+                self.escaped = at == escape_at
+            elif at == open_at:
+                self.depth += 1
+            elif at == close_at:
+                self.depth -= 1
+                if self.depth == 0:
+                    frames.append(decode_frame(bytes(self.buffer) + data[start:pos]))
+                    self.reset()
+
+        if self.depth:
+            self.buffer += data[start:]
+        return frames
+
+def read_frames(ser, reader=None, stop=None):
+    """
+    Generator yielding (arrival time, frame) for every complete object read from ser.
+    Reads whatever is waiting in the OS buffer (blocks up to ser.timeout for the first byte),
+    so records are handed on as soon as their closing brace arrives, no fixed sleep.
+    Ends when the optional threading.Event stop is set.
+    """
+    reader = reader or FrameReader()
+    while stop is None or not stop.is_set():
+        data = ser.read(ser.in_waiting or 1)
+        if not data:
+            continue
+        received = datetime.now()
+        for frame in reader.feed(data):
+            yield received, frame
@@ -1,5 +1,8 @@
 import pandas as pd
 import numpy as np
+import threading
+import time
+from functools import lru_cache
 
 #only using measured data (no external prediction)
 def kalman_filter_self_predicting(measured, Q=1e-5, R=0.1, P_init=1.0, x_init=None):
@@ -57,4 +60,192 @@ def kalman_filter_self_predicting(measured, Q=1e-5, R=0.1, P_init=1.0, x_init=No
         estimates[t] = x_post
 
     return estimates    
-    
\ No newline at end of file
+    
+
+
+BLOCK_SIZE = 65536  # samples per scan block in kalman_filter_batch, bounds memory for long histories
+
+@lru_cache(maxsize=64)
+def _gain_sequence(Q, R, P_init):
+    """
+    Kalman gains K(t) and final P_post until P_post reaches its fixed point.
+    With constant Q/R the gain does not depend on the data, after convergence it is constant.
+    Returns (gains of the transient, constant gain, P_post after convergence)
+    """
+    gains = []
+    P_post = P_init
+    while True:
+        P_prior = P_post + Q
+        K = P_prior / (P_prior + R)
+        P_next = (1 - K) * P_prior
+        if P_next == P_post or len(gains) > 100000:  # exact float fixed point
+            return np.array(gains), K, P_post
+        gains.append(K)
+        P_post = P_next
+
+def _gains(n, Q, R, P_init):
+    """First n gains and P_post after n measurements"""
+    transient, K_const, P_const = _gain_sequence(Q, R, P_init)
+    if n <= len(transient):
+        gains = transient[:n]
+        P_post = P_init
+        for K in gains:  # cheap, only while the gain still changes
+            P_post = (1 - K) * (P_post + Q)
+        return gains, P_post
+    return np.concatenate([transient, np.full(n - len(transient), K_const)]), P_const
+
+def _affine_scan(a, b):
+    """
+    Inclusive prefix scan of x(t) = a(t) * x(t-1) + b(t) (Hillis-Steele, log2(n) NumPy passes).
+    Returns A, B with x(t) = A(t) * x(-1) + B(t).
+    """
+    a = a.copy()
+    b = b.copy()
+    shift = 1
+    while shift < len(a):
+        b[shift:] += a[shift:] * b[:-shift]
+        a[shift:] *= a[:-shift].copy()
+        shift *= 2
+    return a, b
+
+def _filter_channel(z, Q, R, P_post, x_post):
+    valid = ~np.isnan(z)
+    values = z[valid]
+    if np.isnan(x_post):
+        x_post = values[0] if len(values) else np.nan
+    x_start = x_post
+
+    gains, P_last = _gains(len(values), Q, R, P_post)
+    filtered = np.empty(len(values))
+    for start in range(0, len(values), BLOCK_SIZE):
+        block = slice(start, start + BLOCK_SIZE)
+        a, b = _affine_scan(1 - gains[block], gains[block] * values[block])
+        filtered[block] = a * x_post + b
+        x_post = filtered[block][-1]
+
+    # hold the estimate across missing samples (before the first one: the initial estimate)
+    if not len(values):
+        return np.full(len(z), x_start), x_start, P_last
+    seen = np.cumsum(valid)
+    estimates = np.where(seen > 0, filtered[np.maximum(seen - 1, 0)], x_start)
+    return estimates, x_post, P_last
+
+def kalman_filter_batch(measured, Q=1e-5, R=0.1, P_init=1.0, x_init=None, return_state=False):
+    """
+    Vectorized kalman_filter_self_predicting for a whole 2-D array (samples x channels).
+
+    With A = H = 1 and constant Q/R the gain sequence does not depend on the measurements
+    and converges to a constant, so it is computed once per (Q, R, P_init). What is left,
+    x(t) = (1 - K(t)) * x(t-1) + K(t) * z(t), is a linear recurrence solved with a prefix
+    scan in log2(n) NumPy passes. Results match kalman_filter_self_predicting per column
+    up to floating point rounding.
+
+    Parameters:
+    measured: np.array (samples x channels), 1-D arrays are treated as one channel
+    Q, R, P_init: scalars or one value per channel
+    x_init: Initial state estimate per channel -> if None (or NaN), use first valid measurement
+    return_state: also return the final (x_post, P_post) per channel to continue filtering later
+
+    NaN handling (instead of bfill): missing samples are skipped, i.e. each channel is filtered
+    over its valid measurements and the estimate is held across gaps.
+    A channel without any valid measurement (and no x_init) stays NaN.
+    """
+    measured = np.asarray(measured, dtype=float)
+    one_channel = measured.ndim == 1
+    z = measured[:, None] if one_channel else measured
+    n, channels = z.shape
+
+    Q = np.broadcast_to(np.asarray(Q, dtype=float), (channels,))
+    R = np.broadcast_to(np.asarray(R, dtype=float), (channels,))
+    P_post = np.broadcast_to(np.asarray(P_init, dtype=float), (channels,)).copy()
+    x_post = np.broadcast_to(np.asarray(np.nan if x_init is None else x_init, dtype=float), (channels,)).copy()
+
+    estimates = np.empty((n, channels))
+    for c in range(channels):
+        estimates[:, c], x_post[c], P_post[c] = _filter_channel(z[:, c], float(Q[c]), float(R[c]), float(P_post[c]), x_post[c])
+
+    if one_channel:
+        estimates = estimates[:, 0]
+    if return_state:
+        return estimates, x_post, P_post
+    return estimates
+
+
+DEFAULT_NODE = "default"
+
+class IncrementalKalmanFilter:
+    """
+    Stateful Kalman filter that keeps (x_post, P_post) per node and channel between reruns.
+
+    update() only filters rows with an id above the node's checkpoint and continues from the
+    stored state, so the cost per refresh is O(new samples) and already filtered values do not
+    change when the window slides. The latest max_history estimates per node are kept to
+    serve the displayed window. save()/load() persist the checkpoints in the kalman_state table,
+    so a restarted page server continues the curves instead of starting over. Rows at or below a
+    loaded checkpoint have no kept estimate; they are filtered once for display, the checkpoint
+    state is not changed by that.
+    """
+
+    def __init__(self, Q=1e-5, R=0.1, P_init=1.0, max_history=10000):
+        self.Q = Q
+        self.R = R
+        self.P_init = P_init
+        self.max_history = max_history
+        self.lock = threading.Lock()
+        self.last_id = {}     # node -> id of the last filtered row
+        self.state = {}       # (node, channel) -> (x_post, P_post)
+        self.history = {}     # node -> DataFrame of estimates indexed by row id
+        self.saved_at = 0.0   # time.monotonic() of the last save()
+
+    def update(self, df, channels, node=DEFAULT_NODE):
+        """
+        Filter the rows of df (needs 'id' and 'ts_ms') that are newer than the checkpoint.
+        Returns the estimates for all rows of df (same index), NaN where no estimate is kept.
+        """
+        with self.lock:
+            last_id = self.last_id.get(node, 0)
+            new = df[df['id'] > last_id].sort_values('ts_ms')
+
+            if node not in self.history and last_id:
+                # checkpoint loaded from the database: estimates of older rows are not kept
+                old = df[df['id'] <= last_id].sort_values('ts_ms')
+                if not old.empty:
+                    estimates = kalman_filter_batch(old[channels].to_numpy(dtype=float), self.Q, self.R, self.P_init)
+                    self.history[node] = pd.DataFrame(estimates, index=old['id'].to_numpy(), columns=channels)
+
+            if not new.empty:
+                states = [self.state.get((node, c), (np.nan, self.P_init)) for c in channels]
+                estimates, x_post, P_post = kalman_filter_batch(
+                    new[channels].to_numpy(dtype=float), self.Q, self.R,
+                    P_init=[P for _, P in states], x_init=[x for x, _ in states],
+                    return_state=True
+                )
+                for c, x, P in zip(channels, x_post, P_post):
+                    self.state[(node, c)] = (x, P)
+                self.last_id[node] = int(new['id'].max())
+
+                filtered = pd.DataFrame(estimates, index=new['id'].to_numpy(), columns=channels)
+                history = self.history.get(node)
+                history = filtered if history is None else pd.concat([history, filtered])
+                self.history[node] = history.tail(self.max_history)
+
+            history = self.history.get(node, pd.DataFrame(columns=channels))
+            result = history.reindex(index=df['id'].to_numpy(), columns=channels)
+            result.index = df.index
+            return result
+
+    def save(self, conn):
+        with self.lock:
+            conn.executemany(
+                "INSERT OR REPLACE INTO kalman_state (node, channel, last_id, x_post, P_post) VALUES (?, ?, ?, ?, ?)",
+                [(node, c, self.last_id.get(node, 0), x, P) for (node, c), (x, P) in self.state.items()]
+            )
+            conn.commit()
+            self.saved_at = time.monotonic()
+
+    def load(self, conn):
+        with self.lock:
+            for node, channel, last_id, x_post, P_post in conn.execute(
+                    "SELECT node, channel, last_id, x_post, P_post FROM kalman_state"):
+                self.state[(node, channel)] = (np.nan if x_post is None else x_post, P_post)
+                self.last_id[node] = max(self.last_id.get(node, 0), last_id)
@@ -0,0 +1,175 @@
+import argparse
+import hashlib
+import os
+import time
+from datetime import datetime
+import numpy as np
+from collectorLog import setup_logging
+from derivedMetrics import add_derived
+from frameReader import decode_frame
+from onlineStats import OnlineStats
+from replaySource import LOG_PREFIX
+from rollupTables import update_rollups
+from sensorDataCollector import parse_frame
+from sensorDatabase import (DB_NAME, IMPORT_UNIT_SQL, INSERT_SQL, METRICS, ROW_COLUMNS, connect, create_indexes,
+                            drop_indexes, init_db, reading_row, reading_units)
+
+# === CONFIGURATION ===
+TRANSACTION_ROWS = 20000    # records per transaction, bounds memory
+MAX_FRAME_LINES = 200       # a frame without closing brace is given up after this many lines
+PREFIX_LEN = len(b"2025-06-24 13:51:09,941 - ")
+FRAME_BYTES = 800           # approximate size of one frame in serial_log.txt, to estimate the record count
+
+
+def log_frames(f, offset=0):
+    """
+    Stream a serial_log.txt-style log (binary file object) from byte offset on.
+    Yields (logged time of the closing line, frame text, offset after the frame).
+    Lines outside { ... } (e.g. "Delivery confirmed.") and lines without logging prefix are skipped.
+    """
+    f.seek(offset)
+    position = offset
+    lines = None
+    for line in f:
+        position += len(line)
+        # cheap fixed-width check of the prefix, the timestamp is only parsed on closing lines
+        if line[PREFIX_LEN - 3:PREFIX_LEN] != b" - ":
+            continue
+        payload = line[PREFIX_LEN:].strip()
+        if lines is None:
+            if not payload.startswith(b"{"):
+                continue
+            lines = []
+        lines.append(payload)
+
+        if payload.endswith(b"}"):
+            match = LOG_PREFIX.match(line)
+            if not match:
+                lines = None
+                continue
+            year, month, day, hour, minute, second, ms = map(int, match.groups())
+            # decoded like the live FrameReader, so units are stored the same way
+            yield datetime(year, month, day, hour, minute, second, ms * 1000), decode_frame(b"\n".join(lines)), position
+            lines = None
+        elif len(lines) > MAX_FRAME_LINES:
+            lines = None
+
+def fingerprint(path):
+    # first (timestamped) line identifies a log, also after renaming or while it keeps growing
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.readline()).hexdigest()
+
+def _merge_all_time(conn, stats):
+    # fold the imported values into the all-time statistics (hour/day windows only hold recent data)
+    row = conn.execute("SELECT state FROM online_stats WHERE stats_window = 'all' AND bucket_ms = 0").fetchone()
+    total = OnlineStats.from_json(row[0]) if row else OnlineStats()
+    total.merge(stats)
+    conn.execute("INSERT OR REPLACE INTO online_stats (stats_window, bucket_ms, state) VALUES ('all', 0, ?)",
+                 (total.to_json(),))
+
+
+def import_log(conn, path, gateway=None, transaction_rows=TRANSACTION_ROWS, defer_indexes=None):
+    """
+    Import one log into readings with the logging timestamps as record time.
+
+    Records are inserted in large transactions, each also stores the byte offset reached in
+    log_imports. A re-run (or a run after an interruption) continues from there, so nothing is
+    imported twice, and a grown log only adds its new part. Memory stays constant.
+    defer_indexes drops the readings indexes during the import and builds them once at the end,
+    by default when the log holds more records than the table. Rollups and all-time statistics
+    are updated in the same transactions (folded in, so buckets of days whose raw readings were
+    already archived or deleted keep their history); a running collector merges its batches into
+    the stored state, so importing while it runs is safe.
+    Records older than the readings retention (dataRetention.RETENTION) are moved to the Parquet
+    archive by the collector's next maintenance run, or deleted when pyarrow is not installed;
+    their rollups stay.
+    Units are only stored for metrics without one, a unit the collector stored is kept.
+    Returns the number of imported records.
+    """
+    key = fingerprint(path)
+    row = conn.execute("SELECT offset, records FROM log_imports WHERE fingerprint = ?", (key,)).fetchone()
+    offset, records = row if row else (0, 0)
+    size = os.path.getsize(path)
+    if offset >= size:
+        print(f"{path}: already imported ({records} records)")
+        return 0
+
+    if defer_indexes is None:
+        existing = conn.execute("SELECT COALESCE(MAX(id), 0) FROM readings").fetchone()[0]
+        defer_indexes = (size - offset) // FRAME_BYTES > existing
+    if defer_indexes:
+        drop_indexes(conn)
+
+    started = time.perf_counter()
+    imported = 0
+    units = dict(conn.execute("SELECT metric, unit FROM metric_units").fetchall())
+    metric_index = [ROW_COLUMNS.index(metric) for metric in METRICS]
+
+    def commit(rows, changed_units, position):
+        values = np.array([[v if isinstance(v, (int, float)) else np.nan for v in (row[i] for i in metric_index)]
+                           for row in rows], dtype=float).reshape(len(rows), len(METRICS))
+        add_derived(rows)
+        with conn:
+            conn.executemany(INSERT_SQL, rows)
+            conn.executemany(IMPORT_UNIT_SQL, changed_units.items())
+            if rows:
+                update_rollups(conn, rows)
+                _merge_all_time(conn, OnlineStats.from_array(values))
+            conn.execute(
+                "INSERT OR REPLACE INTO log_imports (fingerprint, path, offset, records, updated) VALUES (?, ?, ?, ?, ?)",
+                (key, os.path.abspath(path), position, records + imported, datetime.now().isoformat(timespec='seconds'))
+            )
+
+    try:
+        with open(path, "rb") as f:
+            rows, changed_units, position = [], {}, offset
+            for received, frame, position in log_frames(f, offset):
+                sensor_data = parse_frame(frame)
+                if not sensor_data:
+                    continue
+                rows.append(reading_row(received, sensor_data, gateway))
+                for metric, unit in reading_units(sensor_data).items():
+                    if metric not in units:     # a stored unit is kept
+                        units[metric] = changed_units[metric] = unit
+
+                if len(rows) >= transaction_rows:
+                    imported += len(rows)
+                    commit(rows, changed_units, position)
+                    print(f"{path}: {records + imported} records, {position / 1e6:.1f} of {size / 1e6:.1f} MB")
+                    rows, changed_units = [], {}
+            imported += len(rows)
+            commit(rows, changed_units, position)
+    finally:
+        if defer_indexes:
+            print("Building indexes")
+            create_indexes(conn)
+
+    elapsed = time.perf_counter() - started
+    print(f"{path}: imported {imported} records in {elapsed:.1f} s ({imported / max(elapsed, 1e-9):.0f} records/s)")
+    return imported
+
+
+# === MAIN ===
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import serial_log.txt-style logs into the sensor database")
+    parser.add_argument("logs", nargs="+", help="log files to import")
+    parser.add_argument("--db", default=DB_NAME, help="database (default: sensor_data.db)")
+    parser.add_argument("--gateway", help="gateway the records are tagged with (default: none)")
+    indexes = parser.add_mutually_exclusive_group()
+    indexes.add_argument("--defer-indexes", dest="defer_indexes", action="store_true", default=None,
+                         help="drop the indexes during the import and rebuild them afterwards")
+    indexes.add_argument("--keep-indexes", dest="defer_indexes", action="store_false",
+                         help="keep the indexes (e.g. while the pages are in use)")
+    args = parser.parse_args()
+
+    setup_logging(None)
+    conn = connect(args.db)
+    conn.execute("PRAGMA cache_size = -65536")  # 64 MB page cache for the index builds
+    init_db(conn)
+    total = sum(import_log(conn, path, args.gateway, defer_indexes=args.defer_indexes) for path in args.logs)
+    conn.close()
+    print(f"{total} records imported")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import json
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from sensorDatabase import METRICS, ROW_COLUMNS
+
+# window -> (bucket size ms, number of buckets); "all" is a single bucket that never expires
+WINDOWS = {
+    'hour': (60 * 1000, 60),
+    'day': (15 * 60 * 1000, 96),
+    'all': (None, 1),
+}
+STATS_FLUSH_INTERVAL = 60   # s, the collector stores the statistics of its batches at most this often
+
+
+class OnlineStats:
+    """
+    Running moments of several channels (Welford / Chan et al.), NaN aware per channel pair.
+
+    Every statistic is kept per pair (i, j) over the samples where both channels are present,
+    like pandas' pairwise-complete corr():
+    n[i, j]: sample count, mean[i, j]: mean of channel i, m2[i, j]: sum of squared deviations
+    of channel i, comoment[i, j]: sum of products of deviations of i and j.
+    The diagonal holds the plain per-channel statistics. An update costs O(channels^2),
+    two states can be merged (buckets of a sliding window).
+    """
+
+    def __init__(self, channels=METRICS):
+        self.channels = list(channels)
+        size = len(self.channels)
+        self.n = np.zeros((size, size))
+        self.mean = np.zeros((size, size))
+        self.m2 = np.zeros((size, size))
+        self.comoment = np.zeros((size, size))
+        self.min = np.full(size, np.inf)
+        self.max = np.full(size, -np.inf)
+
+    def update(self, x):
+        """Add one sample (array with one value per channel, NaN = missing)"""
+        x = np.asarray(x, dtype=float)
+        present = ~np.isnan(x)
+        pair = present[:, None] & present[None, :]
+        if not pair.any():
+            return
+        xi = np.where(present, x, 0.0)[:, None]     # value of channel i (rows)
+
+        n = self.n + pair
+        dx = np.where(pair, xi - self.mean, 0.0)
+        mean = self.mean + np.where(pair, dx / np.maximum(n, 1), 0.0)
+        # deviation of channel j, its mean for pair (i, j) is mean[j, i]
+        dy_new = np.where(pair, xi.T - mean.T, 0.0)
+        self.comoment += dx * dy_new
+        self.m2 += dx * np.where(pair, xi - mean, 0.0)
+        self.mean = mean
+        self.n = n
+        self.min = np.fmin(self.min, np.where(present, x, np.inf))
+        self.max = np.fmax(self.max, np.where(present, x, -np.inf))
+
+    def update_batch(self, X):
+        """Add many samples (rows x channels) at once, merged in with the parallel formula"""
+        X = np.asarray(X, dtype=float)
+        if len(X):
+            self.merge(OnlineStats.from_array(X, self.channels))
+
+    @classmethod
+    def from_array(cls, X, channels=METRICS):
+        stats = cls(channels)
+        X = np.asarray(X, dtype=float)
+        present = (~np.isnan(X)).astype(float)
+        if not present.any():
+            return stats
+        # center per channel first for numerical stability of the sum of squares
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)    # all-NaN channels
+            shift = np.nan_to_num(np.nanmean(X, axis=0))
+        Z = np.where(present > 0, X - shift, 0.0)
+
+        n = present.T @ present
+        safe_n = np.maximum(n, 1)
+        sum_i = Z.T @ present                   # sum of channel i over rows where j present
+        mean = sum_i / safe_n
+        stats.n = n
+        stats.mean = np.where(n > 0, mean + shift[:, None], 0.0)
+        stats.m2 = np.where(n > 0, (Z ** 2).T @ present - n * mean ** 2, 0.0)
+        stats.comoment = np.where(n > 0, Z.T @ Z - n * mean * mean.T, 0.0)
+        stats.min = np.nanmin(np.where(present > 0, X, np.inf), axis=0)
+        stats.max = np.nanmax(np.where(present > 0, X, -np.inf), axis=0)
+        return stats
+
+    def merge(self, other):
+        """Combine other into self (pairwise parallel algorithm), returns self"""
+        n = self.n + other.n
+        safe_n = np.maximum(n, 1)
+        delta = other.mean - self.mean
+        weight = self.n * other.n / safe_n
+        self.comoment = self.comoment + other.comoment + delta * delta.T * weight
+        self.m2 = self.m2 + other.m2 + delta ** 2 * weight
+        self.mean = np.where(n > 0, self.mean + delta * other.n / safe_n, 0.0)
+        self.n = n
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        return self
+
+    def summary(self):
+        """DataFrame with count, min, max, mean per channel"""
+        count = np.diag(self.n)
+        has = count > 0
+        return pd.DataFrame({
+            'count': count,
+            'min': np.where(has, self.min, np.nan),
+            'max': np.where(has, self.max, np.nan),
+            'mean': np.where(has, np.diag(self.mean), np.nan),
+        }, index=self.channels)
+
+    def corr(self):
+        """Pairwise-complete Pearson correlation matrix as DataFrame (NaN if undefined)"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = self.comoment / np.sqrt(self.m2 * self.m2.T)
+        corr = np.where((self.n > 1) & np.isfinite(corr), np.clip(corr, -1, 1), np.nan)
+        return pd.DataFrame(corr, index=self.channels, columns=self.channels)
+
+    def to_json(self):
+        return json.dumps({
+            'channels': self.channels,
+            'n': self.n.tolist(), 'mean': self.mean.tolist(), 'm2': self.m2.tolist(),
+            'comoment': self.comoment.tolist(),
+            # inf is no valid JSON, empty channels are stored as None
+            'min': [None if np.isinf(v) else v for v in self.min.tolist()],
+            'max': [None if np.isinf(v) else v for v in self.max.tolist()],
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        stats = cls(data['channels'])
+        for key in ('n', 'mean', 'm2', 'comoment'):
+            setattr(stats, key, np.array(data[key], dtype=float))
+        stats.min = np.array([np.inf if v is None else v for v in data['min']])
+        stats.max = np.array([-np.inf if v is None else v for v in data['max']])
+        return stats
+
+
+def _bucket(ts_ms, size):
+    return 0 if size is None else ts_ms - ts_ms % size
+
+
+class StatsEngine:
+    """
+    Collector side: folds each writer batch into the touched bucket of every window
+    (writer batch hook). Batches are summarized and added up in memory per bucket; the sums are
+    merged into the stored buckets, re-read inside the writer's transaction, once flush_interval
+    seconds passed since the last write (buckets that already left their window are dropped).
+    So a batch costs no database work most of the time, and other writers (logImporter) are
+    still never overwritten.
+    Batch sums only count after commit(), a rolled back batch leaves no trace. flush(conn)
+    writes what is left (called by the writer when it stops). Stored buckets that left their
+    window are deleted on every write.
+    """
+
+    def __init__(self, flush_interval=STATS_FLUSH_INTERVAL, clock=time.monotonic):
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.pending = {}       # (window, bucket_ms) -> OnlineStats of committed batches not yet stored
+        self.batch = {}         # (window, bucket_ms) -> OnlineStats of the current batch
+        self.written = set()    # keys stored by the current batch
+        self.flushed_at = clock()
+        self.newest_ms = None   # newest committed ts_ms, decides which buckets left their window
+        self.batch_newest_ms = None
+        self.due = False        # the current batch stores everything (flush_interval passed)
+
+    def __call__(self, conn, rows):
+        ts_index = ROW_COLUMNS.index('ts_ms')
+        metric_index = [ROW_COLUMNS.index(metric) for metric in METRICS]
+        values = np.array(
+            [[v if isinstance(v, (int, float)) else np.nan for v in (row[i] for i in metric_index)] for row in rows],
+            dtype=float
+        ).reshape(len(rows), len(METRICS))
+        ts = np.array([row[ts_index] for row in rows], dtype=np.int64)
+
+        self.batch, self.written = {}, set()
+        for window, (size, _) in WINDOWS.items():
+            buckets = np.zeros_like(ts) if size is None else ts - ts % size
+            for bucket_ms in np.unique(buckets):
+                stats = self.batch[(window, int(bucket_ms))] = OnlineStats()
+                stats.update_batch(values[buckets == bucket_ms])
+
+        newest_ms = max(int(ts.max()), self.newest_ms) if self.newest_ms is not None else int(ts.max())
+        self.batch_newest_ms = newest_ms
+        self.due = self.clock() - self.flushed_at >= self.flush_interval
+        if self.due:
+            self._write(conn, set(self.pending) | set(self.batch), newest_ms)
+
+    def _write(self, conn, keys, newest_ms):
+        oldest = {window: _bucket(newest_ms, size) - (count - 1) * size
+                  for window, (size, count) in WINDOWS.items() if size is not None}
+        for key in keys:
+            self.written.add(key)
+            if key[1] < oldest.get(key[0], key[1]):
+                continue    # left its window, the stored bucket is deleted below
+            row = conn.execute("SELECT state FROM online_stats WHERE stats_window = ? AND bucket_ms = ?", key).fetchone()
+            stats = OnlineStats.from_json(row[0]) if row else OnlineStats()
+            for part in (self.pending.get(key), self.batch.get(key)):
+                if part is not None:
+                    stats.merge(part)
+            conn.execute("INSERT OR REPLACE INTO online_stats (stats_window, bucket_ms, state) VALUES (?, ?, ?)",
+                         (*key, stats.to_json()))
+        for window, bucket_ms in oldest.items():
+            conn.execute("DELETE FROM online_stats WHERE stats_window = ? AND bucket_ms < ?", (window, bucket_ms))
+
+    def flush(self, conn):
+        """Store all pending sums (inside the caller's transaction, commit() afterwards)"""
+        self.batch, self.written = {}, set()
+        self.batch_newest_ms, self.due = self.newest_ms, True
+        if self.pending:
+            self._write(conn, list(self.pending), self.newest_ms)
+
+    def commit(self):
+        for key, stats in self.batch.items():
+            if key not in self.written:
+                self.pending[key] = self.pending[key].merge(stats) if key in self.pending else stats
+        for key in self.written:
+            self.pending.pop(key, None)
+        if self.due:
+            self.flushed_at = self.clock()
+        self.newest_ms = self.batch_newest_ms
+        self.batch, self.written, self.due = {}, set(), False
+
+    def rollback(self):
+        self.batch, self.written, self.due = {}, set(), False
+        self.batch_newest_ms = self.newest_ms
+
+
+def load_window(conn, window, now_ms):
+    """Pages: merged OnlineStats of a window ('hour', 'day', 'all') from online_stats"""
+    size, count = WINDOWS[window]
+    oldest = 0 if size is None else _bucket(now_ms, size) - (count - 1) * size
+    stats = OnlineStats()
+    for (state,) in conn.execute(
+            "SELECT state FROM online_stats WHERE stats_window = ? AND bucket_ms >= ?", (window, oldest)):
+        stats.merge(OnlineStats.from_json(state))
+    return stats
+
+def rebuild_all_time(conn, chunk=50000):
+    """All-time statistics from the existing readings, in chunks"""
+    stats = OnlineStats()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT id, {', '.join(METRICS)} FROM readings WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk)
+        ).fetchall()
+        if not rows:
+            break
+        X = np.array([row[1:] for row in rows], dtype=float)
+        stats.update_batch(X)
+        last_id = rows[-1][0]
+    conn.execute("INSERT OR REPLACE INTO online_stats (stats_window, bucket_ms, state) VALUES ('all', 0, ?)",
+                 (stats.to_json(),))
+    conn.commit()
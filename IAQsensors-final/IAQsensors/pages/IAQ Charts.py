@@ -1,9 +1,11 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
-from streamlit_autorefresh import st_autorefresh
-import plotly.express as px
-from kalmanFilter import kalman_filter_self_predicting
+from datetime import datetime, timedelta
+from dataAccess import (RANGE_REFRESH, auto_refresh, get_latest_readings, get_online_stats, get_range, load_kalman_state,
+                        save_kalman_state, select_gateway, select_range_gateway)
+from kalmanFilter import DEFAULT_NODE, IncrementalKalmanFilter, kalman_filter_batch
+from downsampling import PIXEL_BUDGET, lttb_indices
+from sensorDatabase import to_epoch_ms
 #ALI
 import streamlit as st
 import time
@@ -32,18 +34,57 @@ st.write("This is your main dashboard content")
 st.set_page_config(page_title="IAQ Monitoring", layout="wide")
 st.title("IAQ Time Series")
 
-# Auto-refresh every 5 seconds based on incoming data
-st_autorefresh(interval=5000, key="data_refresh")
+# Filter state shared by all sessions, keeps curves stable while the window slides;
+# checkpoints are kept in kalman_state, so a restart continues the curves
+@st.cache_resource
+def get_kalman_filter():
+    return load_kalman_state(IncrementalKalmanFilter())
 
-# Connect to the SQLite database
-conn = sqlite3.connect("sensor_data.db", check_same_thread=False)
+# Expected pollutant list
+pollutants = [
+    'co2', 'temperature', 'humidity', 'tvoc', 'eco2',
+    'pm_0_5', 'pm_1_0', 'pm_2_5', 'pm_4_0', 'pm_10_0',
+    'pm_1_0_nc', 'pm_2_5_nc', 'pm_4_0_nc', 'pm_10_0_nc',
+    'typical_particle_size'
+]
 
-# Read latest N entries
-df = pd.read_sql_query(
-    "SELECT * FROM sensor_readings ORDER BY timestamp DESC LIMIT 100",
-    conn,
-    parse_dates=['timestamp']
-)
+# Live: latest N entries, otherwise an indexed ts_ms range query. Up to RAW_LIMIT raw rows are
+# read (with Kalman filter), longer ranges come from the rollup tables (min/max/mean per bucket).
+# Every series is downsampled with LTTB to PIXEL_BUDGET points before plotting.
+RAW_LIMIT = 100000
+time_ranges = {
+    "Live (last 100 readings)": None,
+    "Last hour": timedelta(hours=1),
+    "Last day": timedelta(days=1),
+    "Last week": timedelta(weeks=1),
+    "Last 30 days": timedelta(days=30),
+    "Custom": "custom",
+}
+time_range = st.selectbox("Time range", list(time_ranges))
+live = time_ranges[time_range] is None
+
+# Rerun when the collector wrote new readings (checked every second, fallback every minute),
+# range views (raw query, Kalman filter, LTTB) at most every RANGE_REFRESH seconds
+auto_refresh(0 if live else RANGE_REFRESH)
+
+if live:
+    # Read latest N entries (shared cache, only new rows are fetched from the database)
+    df, gateway = select_gateway(get_latest_readings(100))
+    resolution = None
+else:
+    if time_range == "Custom":
+        today = datetime.now().date()
+        dates = st.date_input("Date range", value=(today - timedelta(days=1), today))
+        start = datetime.combine(dates[0], datetime.min.time())
+        end = datetime.combine(dates[-1] + timedelta(days=1), datetime.min.time())
+    else:
+        end = datetime.now()
+        start = end - time_ranges[time_range]
+    # raw readings of the selected gateway, so rolling means and the Kalman filter see one sender
+    gateway, gateway_count = select_range_gateway()
+    resolution, df = get_range(pollutants, to_epoch_ms(start), to_epoch_ms(end), RAW_LIMIT, gateway)
+    if resolution is not None and gateway_count > 1:
+        st.caption("Aggregated over all gateways (rollups are not kept per gateway)")
 
 if not df.empty:
     df['timestamp'] = pd.to_datetime(df['timestamp']) #ensure timestamp is in datetime format
@@ -53,14 +94,15 @@ if not df.empty:
 else:
     print("No data available in the database.")
 
-
-# Expected pollutant list
-pollutants = [
-    'co2', 'temperature', 'humidity', 'tvoc', 'eco2',
-    'pm_0_5', 'pm_1_0', 'pm_2_5', 'pm_4_0', 'pm_10_0',
-    'pm_1_0_nc', 'pm_2_5_nc', 'pm_4_0_nc', 'pm_10_0_nc',
-    'typical_particle_size'
-]
+# Min/Max/Avg and correlations: from the displayed data or the collector's running statistics
+stats_windows = {
+    "Displayed data": None,
+    "Last hour": "hour",
+    "Last day": "day",
+    "All time": "all",
+}
+stats_window = stats_windows[st.selectbox("Statistics over", list(stats_windows),
+                                          help="The collector's running statistics cover all gateways")]
 
 # Check which pollutants are available in the DataFrame
 available = [p for p in pollutants if p in df.columns]
@@ -70,33 +112,63 @@ if not df.empty:
     cols = st.columns(3)    #display in twhree columns
 
     #time for x-axis
-    df['time'] = df['timestamp'].dt.strftime('%H:%M:%S')  
+    df['time'] = df['timestamp'].dt.strftime('%H:%M:%S' if live else '%m-%d %H:%M')
 
     # Compute correlation matrix for available pollutants
-    corr_matrix = df[available].corr()
+    if stats_window is None:
+        corr_matrix = df[available].corr()
+    else:
+        online_stats = get_online_stats(stats_window)
+        corr_matrix = online_stats.corr()
+        stats_summary = online_stats.summary()
+
+    # Kalman filter all pollutants in one pass, only rows newer than the last rerun are filtered
+    if live:
+        kfiltered_all = get_kalman_filter().update(df, available, node=gateway or DEFAULT_NODE)
+        save_kalman_state(get_kalman_filter())
+    elif resolution is None:
+        kfiltered_all = pd.DataFrame(kalman_filter_batch(df[available].to_numpy(dtype=float)),
+                                     index=df.index, columns=available)
+
+    # LTTB point selection per pollutant (same points for all series of one chart)
+    selected = lttb_indices(df['ts_ms'].to_numpy(), df[available].to_numpy(dtype=float), PIXEL_BUDGET)
 
     for i, pollutant in enumerate(available):
         with cols[i % 3]:
             st.markdown(f"**{pollutant.upper()}**")
 
-            #Calculate rolling mean (1 minute window)
-            rolling_mean = df[pollutant].rolling(30,1).mean().bfill()  #30 samples for 1 minute at s intervals 
-            
-            array_data = df[pollutant].bfill().to_numpy()
-            kfiltered = kalman_filter_self_predicting(array_data)
-  
-            #combine original and smoothed data
-            chart_df = pd.DataFrame({
-                "Raw": df[pollutant],
-                "Mean Average": rolling_mean,
-                "Kalman Filter": kfiltered
-            })
+            if resolution is None:
+                #Calculate rolling mean (1 minute window)
+                if live:
+                    rolling_mean = df[pollutant].rolling(30,1).mean()  #30 samples for 1 minute at s intervals 
+                else:
+                    rolling_mean = df.rolling('60s', on='timestamp')[pollutant].mean()
+                
+                kfiltered = kfiltered_all[pollutant]
+      
+                #combine original and smoothed data
+                chart_df = pd.DataFrame({
+                    "Raw": df[pollutant],
+                    "Mean Average": rolling_mean,
+                    "Kalman Filter": kfiltered
+                })
+            else:
+                # bucket mean with its min/max envelope
+                chart_df = pd.DataFrame({
+                    "Min": df[f"{pollutant}_min"],
+                    "Mean Average": df[pollutant],
+                    "Max": df[f"{pollutant}_max"]
+                })
             chart_df.index = df['time']  # Add time for x-axis
+            chart_df = chart_df.iloc[selected[:, i]]   # downsampled to the pixel budget
 
                         # Show min, max, avg
-            min_val = df[pollutant].min()
-            max_val = df[pollutant].max()
-            avg_val = df[pollutant].mean()
+            if stats_window is None:
+                min_val = df[pollutant if resolution is None else f"{pollutant}_min"].min()
+                max_val = df[pollutant if resolution is None else f"{pollutant}_max"].max()
+                avg_val = df[pollutant].mean()
+            else:
+                min_val, max_val, avg_val = stats_summary.loc[pollutant, ['min', 'max', 'mean']]
             st.markdown(
                 f"<div style='display: flex; gap: 2em;'>"
                 f"<span>Min: <b>{min_val:.2f}</b></span>"
@@ -111,7 +183,7 @@ if not df.empty:
 
                         # Show top 2 correlated pollutants (excluding self)
             if len(available) > 1:
-                corrs = corr_matrix[pollutant].drop(pollutant).abs().sort_values(ascending=False)
+                corrs = corr_matrix.loc[available, pollutant].drop(pollutant).abs().dropna().sort_values(ascending=False)
                 top_corrs = corrs.head(2)
                 if not top_corrs.empty:
                     st.markdown("**Top correlated with:**")
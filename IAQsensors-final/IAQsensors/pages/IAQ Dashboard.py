@@ -1,9 +1,10 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
-from streamlit_autorefresh import st_autorefresh
-from calculateIndeces import calculate_humidex_series
-from visTools import create_gauge
+from datetime import datetime
+from dataAccess import auto_refresh, get_latest_readings, get_time_in_band, select_gateway
+from sensorDatabase import DAY_MS, to_epoch_ms
+from comfortLevels import comfort_levels, get_comfort_level
+from visTools import label_html, legend_html, plot_gauge
 from visTools import get_unit_mapping
 # ========== LOGIN CHECK - YAHAN ADD KARO ========== #
 import streamlit as st
@@ -33,69 +34,28 @@ st.write("This is your main dashboard content")
 st.set_page_config(page_title="IAQ Monitoring", layout="wide")
 st.title("IAQ Dashboard")
 
-# Auto-refresh every 5 seconds based on incoming data
-st_autorefresh(interval=5000, key="data_refresh")
+# Rerun when the collector wrote new readings (checked every second, fallback every minute)
+auto_refresh()
 
-# Connect to the SQLite database
-conn = sqlite3.connect("sensor_data.db", check_same_thread=False)
-
-query = """
-    SELECT timestamp, co2, co2_unit, tvoc, tvoc_unit, pm_2_5, pm_2_5_unit, pm_10_0, pm_10_0_unit,
-    temperature, temperature_unit, humidity, humidity_unit
-    FROM sensor_readings
-    ORDER BY timestamp DESC
-    LIMIT 100
-"""
-
-# Read latest N entries
-df = pd.read_sql_query(
-    query,
-    conn,
-    parse_dates=['timestamp']
-)
+# Read latest N entries (shared cache, only new rows are fetched from the database)
+columns = [
+    'timestamp', 'co2', 'co2_unit', 'tvoc', 'tvoc_unit', 'pm_2_5', 'pm_2_5_unit', 'pm_10_0', 'pm_10_0_unit',
+    'temperature', 'temperature_unit', 'humidity', 'humidity_unit', 'humidex', 'comfort_band'
+]
+df, gateway = select_gateway(get_latest_readings(100))
+df = df[[c for c in columns if c in df.columns]]
 
 # Only keep relevant pollutants
 pollutants = ['co2', 'tvoc', 'pm_2_5', 'pm_10_0']
 
-if not df.empty and 'temperature' in df.columns and 'humidity' in df.columns:
-    df["humidex"] = calculate_humidex_series(df["temperature"], df["humidity"])
+# humidex and its comfort band are computed by the collector once per reading
+if not df.empty and 'humidex' in df.columns:
     pollutants.append("humidex")
 
 # Define final units to display
 pollutants_to_display = ['co2', 'tvoc', 'pm_2_5', 'pm_10_0', 'humidex']
 available = [p for p in pollutants_to_display if p in df.columns]
 
-comfort_levels = {
-    "tvoc": [
-        (0, "Most Comfort", "#00FF00"),      
-        (0.2, "Irritations and Discomfort", "#FFFF00"),     
-        (3, "Headaches possible", "#FFA500"),     
-        (25, "Neurotoxic", "#FF4500"),            
-    ],
-    "co2": [
-        (0, "Most Comfort", "#00FF00"),
-        (1000, "Concentration problems", "#FFFF00"),
-        (2000, "Dangerous", "#FF4500")
-    ],
-    "pm_2_5": [
-        (0, "Most Comfort",  "#00FF00"),
-        (10, "Dangerous over a year", "#FFFF00"),
-        (25, "Dangerous within a day", "#FF4500"),
-    ],
-    "pm_10_0": [
-        (0, "Most Comfort", "#00FF00"),
-        (20, "Dangerous over a year", "#FFFF00"),
-        (50, "Dangerous within a day", "#FF4500")
-    ],
-    "humidex": [
-        (0, "Comfort", "#00FF00"),           
-        (20, "Little Comfort", "#FFFF00"),   
-        (30, "Some Discomfort", "#FFA500"),  
-        (40, "Great Discomfort, avoid exertion", "#FF4500"), 
-        (45, "Dangerous, heat strokes possible", "#8B0000")         
-    ],
-}
-
 # Add info text for each pollutant
 pollutant_info = {
     "co2": (
@@ -135,19 +95,6 @@ pollutant_info = {
     )
 }
 
-def get_comfort_level(pollutant, value):
-    thresholds = comfort_levels.get(pollutant.lower())
-    if not thresholds or pd.isna(value) or value < 0:
-        return "Unknown", "gray"
-
-    for threshold, lvl_label, lvl_color in thresholds:
-        if value >= threshold:
-            label, color = lvl_label, lvl_color
-        else:
-            break  # Stop at first threshold greater than value
-
-    return label, color
-
 # Display latest sensor trends if not df.empty:
 if not df.empty: 
     cols = st.columns(3)    #display in three columns
@@ -155,42 +102,49 @@ if not df.empty:
 
     for i, pollutant in enumerate(available):
         latest_value = df[pollutant].iloc[0]  # Most recent value
-        label, color = get_comfort_level(pollutant, (latest_value))
+        if pollutant == "humidex" and pd.notna(df["comfort_band"].iloc[0]):
+            _, label, color = comfort_levels["humidex"][int(df["comfort_band"].iloc[0])]
+        else:
+            label, color = get_comfort_level(pollutant, (latest_value))
         info = pollutant_info.get(pollutant, "")
         max_value = comfort_levels[pollutant][-1][0]  # Last threshold value
         unit = unit_map.get(pollutant, "")  # Get unit from the map
         title = f"{pollutant.upper()} ({unit})" if unit else pollutant.upper()
 
         with cols[i % 3]:
-            st.plotly_chart(
-                create_gauge(title, latest_value, label, color, max_value)
-                ,use_container_width=True
-                )
-
-            # Centered current label with info icon
-            st.markdown(
-                f"""<div style="text-align:center;">
-                        <strong>{label}</strong>
-                        <span title="{info}" style="cursor: pointer;">&#8505;</span>
-                    </div>""",
-                unsafe_allow_html=True
-            )
+            plot_gauge(title, latest_value, color, max_value, use_container_width=True)
+
+            # label and legend markup are built once and cached
+            st.markdown(label_html(label, info), unsafe_allow_html=True)
+            st.markdown(legend_html(tuple(comfort_levels[pollutant])), unsafe_allow_html=True)
 
-                        # Show all possible labels as a legend, centered
-            legend_html = '<div style="text-align:center; margin-top: 0.5em;">'
-            for _, lvl_label, lvl_color in comfort_levels[pollutant]:
-                legend_html += (
-                    f'<span style="display:inline-flex; align-items:center; margin:0 8px;">'
-                    f'<span style="display:inline-block; width:16px; height:16px; background:{lvl_color}; border-radius:3px; margin-right:6px; border:1px solid #888;"></span>'
-                    f'<span style="color:#111;">{lvl_label}</span>'
-                    f'</span>'
-                )
-            legend_html += '</div>'                    
-            st.markdown(legend_html, unsafe_allow_html=True)
-            
 else:
     st.warning("No data available.")
 
+# Exposure summary: time spent in each comfort band, over the whole history in the range
+with st.expander("Exposure summary (hours per comfort band)"):
+    ranges = {"Last 7 days": 7, "Last 30 days": 30, "Last year": 365}
+    periods = {"Day": "D", "Week": "W", "Month": "M"}
+    range_col, period_col = st.columns(2)
+    days = ranges[range_col.selectbox("Range", list(ranges), index=1)]
+    period = periods[period_col.selectbox("Per", list(periods))]
+
+    # the scan can take a while for long ranges, it only runs once asked for (expanders always run)
+    if not st.toggle("Compute summary", key="exposure_summary"):
+        st.caption("Scans all readings of the range, cached for 10 minutes.")
+    else:
+        # end rounded up to 10 minutes, so reruns hit the cached result
+        end_ms = to_epoch_ms(datetime.now())
+        end_ms += 600000 - end_ms % 600000
+        summary = get_time_in_band(tuple(pollutants_to_display), end_ms - days * DAY_MS, end_ms, period, gateway)
+        if summary.empty:
+            st.info("No readings in this range.")
+        else:
+            table = summary.assign(period=summary['period'].astype(str)).pivot_table(
+                index=['period', 'pollutant'], columns='band', values='hours', aggfunc='sum', fill_value=0.0, sort=False
+            )
+            st.dataframe(table.round(1), use_container_width=True)
+
 st.markdown("Threshold sources: ")
 st.markdown("- https://www.umweltbundesamt.de/sites/default/files/medien/pdfs/feinstaub_2008.pdf")
 st.markdown("- https://www.umweltbundesamt.de/sites/default/files/medien/pdfs/kohlendioxid_2008.pdf")
@@ -1,7 +1,5 @@
 import streamlit as st
-from streamlit_autorefresh import st_autorefresh
-import pandas as pd
-import sqlite3
+from dataAccess import auto_refresh, get_latest_readings
 
 import streamlit as st
 import time
@@ -30,18 +28,11 @@ st.set_page_config(page_title="IAQ Monitoring", layout="wide")
 
 st.title("IAQ Data Table")
 
-# Auto-refresh every 5 seconds based on incoming data
-st_autorefresh(interval=5000, key="data_refresh")
+# Rerun when the collector wrote new readings (checked every second, fallback every minute)
+auto_refresh()
 
-# Connect to the SQLite database
-conn = sqlite3.connect("sensor_data.db", check_same_thread=False)
+# Read latest N entries (shared cache, only new rows are fetched from the database)
+df = get_latest_readings(100)
 
-# Read latest N entries
-df = pd.read_sql_query(
-    "SELECT * FROM sensor_readings ORDER BY timestamp DESC LIMIT 100",
-    conn,
-    parse_dates=['timestamp']
-)
-
-df_display = df.drop(columns=['id'], errors='ignore')  # safely drop 'id' if exists
+df_display = df.drop(columns=['id', 'ts_ms'], errors='ignore')  # safely drop internal columns if exist
 st.dataframe(df_display, use_container_width=True, hide_index=True)
\ No newline at end of file
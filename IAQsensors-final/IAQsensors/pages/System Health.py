@@ -1,5 +1,12 @@
 import streamlit as st
 import os
+import pandas as pd
+from datetime import datetime
+from collections import deque
+from collectorLog import LOG_FILE, filter_lines, follow_log, tail_lines
+from collectorMetrics import rates
+from dataAccess import get_collector_snapshots
+from sensorDatabase import to_epoch_ms, to_local_time
 
 import streamlit as st
 import time
@@ -27,21 +34,104 @@ st.write("This is your main dashboard content")
 st.set_page_config(page_title="IAQ Monitoring", layout="wide")
 st.title("Error Logging")
 
-LOG_FILE = "error.log"  # Adjust path if needed
+# === COLLECTOR METRICS ===
+METRICS_REFRESH = 5         # s, the collector writes a snapshot every 10 s
+STALE_AFTER = 60 * 1000     # ms without a snapshot before the collector counts as stopped
 
-def read_log(file_path):
-    if not os.path.exists(file_path):
-        return "No errors occurred."
-    with open(file_path, "r", encoding="utf-8") as f:
-        return f.read()
+@st.fragment(run_every=METRICS_REFRESH)
+def collector_metrics():
+    # only this part of the page reruns, from the snapshots the collector writes to collector_metrics
+    st.subheader("Collector")
+    snapshots = get_collector_snapshots()
+    if not snapshots:
+        st.info("No collector metrics in the last hour.")
+        return
+    ts_ms, state = snapshots[-1]
+    now_ms = to_epoch_ms(datetime.now())
+    if now_ms - ts_ms > STALE_AFTER:
+        st.warning(f"Last collector snapshot {(now_ms - ts_ms) / 60000:.0f} min ago, the collector may have stopped.")
+
+    frame_rates = rates(snapshots, 'frames')
+    cols = st.columns(6)
+    cols[0].metric("Frames/s", f"{frame_rates[-1][1]:.2f}" if frame_rates else "-")
+    cols[1].metric("Records written", state.get('written', 0))
+    cols[2].metric("Queue depth", state.get('queue_depth', 0))
+    cols[3].metric("Parse failures", sum(state['parse_failures'].values()))
+    cols[4].metric("Reconnects", sum(state['reconnects'].values()))
+    cols[5].metric("Dropped", state.get('dropped', 0))
+
+    left, right = st.columns(2)
+    with left:
+        st.markdown("**Frames/s (last hour)**")
+        if frame_rates:
+            rate_df = pd.DataFrame(frame_rates, columns=['ts_ms', 'frames/s'])
+            rate_df.index = to_local_time(rate_df['ts_ms'])
+            st.line_chart(rate_df['frames/s'])
+
+        st.markdown("**Nodes**")
+        nodes = pd.DataFrame({
+            'frames': state['frames'],
+            'parse failures': state['parse_failures'],
+            'reconnects': state['reconnects'],
+            'last seen (s ago)': {node: round((now_ms - seen) / 1000) for node, seen in state['last_seen'].items()},
+        }).fillna(0)
+        st.dataframe(nodes, use_container_width=True)
+
+    with right:
+        st.markdown("**Commit latency (transactions per bucket, ms)**")
+        commits = state['commit_ms']
+        st.bar_chart(pd.Series(commits.values(), index=pd.Index([f"<={b}" if b != 'inf' else ">1000" for b in commits],
+                                                                 name='ms'), name='commits'))
+        if state['commits']:
+            st.caption(f"mean {state['commit_seconds'] / state['commits'] * 1000:.1f} ms over {state['commits']} commits")
+
+        st.markdown("**Error payloads per sensor**")
+        if state['error_payloads']:
+            st.bar_chart(pd.Series(state['error_payloads'], name='errors'))
+        else:
+            st.caption("No error payloads since the collector started.")
+
+collector_metrics()
+
+# === COLLECTOR LOG ===
+# only the end of error.log is read (reverse seek), follow mode reads what was appended since the
+# last byte offset, so memory and render time do not grow with the log
+FOLLOW_INTERVAL = 2     # s
+line_counts = [100, 200, 500, 1000]
+severities = {"All": None, "Info": "INFO", "Warning": "WARNING", "Error": "ERROR"}
 
 st.subheader("Latest Errors")
-log_content = read_log(LOG_FILE)
-st.code(log_content, language="text")
+count_col, level_col, follow_col = st.columns(3)
+n = count_col.selectbox("Lines", line_counts, index=1)
+min_level = severities[level_col.selectbox("Severity", list(severities), index=2)]
+follow = follow_col.toggle("Follow")
+
+def show_log(lines):
+    st.code("\n".join(lines) if lines else "No errors occurred.", language="text")
+
+if not follow:
+    show_log(tail_lines(LOG_FILE, n, min_level)[0])
+else:
+    # the buffer of the last n lines is rebuilt when the settings change
+    settings = (n, min_level)
+    if st.session_state.get("log_follow_settings") != settings:
+        lines, offset = tail_lines(LOG_FILE, n, min_level)
+        st.session_state.log_follow_settings = settings
+        st.session_state.log_lines = deque(lines, maxlen=n)
+        st.session_state.log_offset = offset
+
+    @st.fragment(run_every=FOLLOW_INTERVAL)
+    def follow_log_fragment():
+        lines, st.session_state.log_offset = follow_log(LOG_FILE, st.session_state.log_offset)
+        st.session_state.log_lines.extend(filter_lines(lines, min_level))
+        show_log(st.session_state.log_lines)
+
+    follow_log_fragment()
 
 if st.button("Clear Log"):
     if os.path.exists(LOG_FILE):
         open(LOG_FILE, "w").close()
+        st.session_state.pop("log_follow_settings", None)
         st.success("Log cleared.")
     else:
-        st.info("No log file to clear.")
\ No newline at end of file
+        st.info("No log file to clear.")
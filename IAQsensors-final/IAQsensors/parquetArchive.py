@@ -0,0 +1,158 @@
+import argparse
+import glob
+import logging
+import os
+from datetime import datetime, timezone
+import pandas as pd
+from collectorLog import setup_logging
+from sensorDatabase import DAY_MS, DB_NAME, DERIVED, METRICS, connect, delete_batched, init_db, to_epoch_ms, to_local_time
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:     # optional, without it everything is read from SQLite
+    pa = pq = None
+
+log = logging.getLogger(__name__)
+
+# === CONFIGURATION ===
+ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")
+HOT_DAYS = 7            # closed days kept in sensor_data.db before they are archived
+
+_missing_pyarrow_reported = False
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The Parquet archive needs pyarrow: pip install pyarrow")
+
+def archive_schema():
+    # compact dtypes: float32 values (sensor resolution is far below), dictionary encoded gateway
+    return pa.schema(
+        [('id', pa.int64()), ('ts_ms', pa.int64()), ('gateway', pa.dictionary(pa.int32(), pa.string()))]
+        + [(metric, pa.float32()) for metric in METRICS + DERIVED if metric != 'comfort_band']
+        + [('comfort_band', pa.int8())]
+    )
+
+def day_path(day_ms, archive_dir=ARCHIVE_DIR):
+    """Partition file of the UTC day starting at day_ms (days are UTC aligned, like the rollups)"""
+    day = datetime.fromtimestamp(day_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+    return os.path.join(archive_dir, f"day={day}", "readings.parquet")
+
+def archived_days(archive_dir=ARCHIVE_DIR):
+    """Start (ms) of all archived days, ascending"""
+    days = []
+    for path in glob.glob(os.path.join(archive_dir, "day=*", "readings.parquet")):
+        day = os.path.basename(os.path.dirname(path))[len("day="):]
+        days.append(to_epoch_ms(datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)))
+    return sorted(days)
+
+
+# === ARCHIVE JOB ===
+def _write_day(df, path):
+    """Write one day, merged with an existing partition (late rows, re-run after an interruption)"""
+    table = pa.Table.from_pandas(df, schema=archive_schema(), preserve_index=False)
+    if os.path.exists(path):
+        table = pa.concat_tables([pq.read_table(path, schema=archive_schema()), table])
+        merged = table.to_pandas().drop_duplicates('id', keep='last').sort_values('ts_ms')
+        table = pa.Table.from_pandas(merged, schema=archive_schema(), preserve_index=False)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)  # readers never see a half written file
+
+def archive_days(conn, keep_days=HOT_DAYS, archive_dir=ARCHIVE_DIR, now_ms=None):
+    """
+    Move closed UTC days older than keep_days from readings into day partitions
+    (archive/day=YYYY-MM-DD/readings.parquet). A day is written completely before its rows are
+    deleted in small batches, so an interrupted run loses nothing and is simply repeated.
+    The rollup tables stay in SQLite. Returns the number of archived rows.
+    """
+    _require_pyarrow()
+    now_ms = to_epoch_ms(datetime.now()) if now_ms is None else now_ms
+    cutoff = now_ms - now_ms % DAY_MS - keep_days * DAY_MS
+    columns = ['id', 'ts_ms', 'gateway'] + METRICS + DERIVED
+    archived = 0
+
+    day_ms = None
+    while True:
+        # next day with rows, gaps are skipped
+        first = conn.execute("SELECT MIN(ts_ms) FROM readings WHERE ts_ms >= ?",
+                             (-2 ** 62 if day_ms is None else day_ms + DAY_MS,)).fetchone()[0]
+        if first is None or first >= cutoff:
+            break
+        day_ms = first - first % DAY_MS
+
+        df = pd.read_sql_query(
+            f"SELECT {', '.join(columns)} FROM readings WHERE ts_ms >= ? AND ts_ms < ? ORDER BY ts_ms",
+            conn, params=(day_ms, day_ms + DAY_MS)
+        )
+        path = day_path(day_ms, archive_dir)
+        _write_day(df, path)
+        delete_batched(conn, 'readings', 'ts_ms >= ? AND ts_ms < ?', (day_ms, day_ms + DAY_MS))
+        archived += len(df)
+        log.info(f"Archived {len(df)} rows to {path}")
+    return archived
+
+
+# === READER ===
+def load_range(conn, start_ms, end_ms, metrics=METRICS, gateway=None, archive_dir=ARCHIVE_DIR):
+    """
+    Readings of metrics in [start_ms, end_ms) from the archived days (only the needed
+    partitions and columns are read) merged with the rows still in SQLite.
+    Returns a DataFrame with id, ts_ms, gateway, the metrics and a local naive timestamp,
+    sorted by ts_ms.
+    """
+    global _missing_pyarrow_reported
+    columns = ['id', 'ts_ms', 'gateway'] + [metric for metric in metrics if metric in METRICS + DERIVED]
+    parts = []
+
+    days = [day for day in archived_days(archive_dir) if day + DAY_MS > start_ms and day < end_ms]
+    if days and pq is None:
+        if not _missing_pyarrow_reported:
+            log.warning("pyarrow is not installed, archived days are not shown")
+            _missing_pyarrow_reported = True
+    elif days:
+        filters = [('ts_ms', '>=', start_ms), ('ts_ms', '<', end_ms)]
+        if gateway is not None:
+            filters.append(('gateway', '=', gateway))
+        for day in days:
+            # schema: partitions written before a column existed read it as nulls
+            table = pq.read_table(day_path(day, archive_dir), schema=archive_schema(), columns=columns, filters=filters)
+            parts.append(table.to_pandas().astype({'gateway': object}))
+
+    query = f"SELECT {', '.join(columns)} FROM readings WHERE ts_ms >= ? AND ts_ms < ?"
+    params = [start_ms, end_ms]
+    if gateway is not None:
+        query += " AND gateway = ?"
+        params.append(gateway)
+    parts.append(pd.read_sql_query(query + " ORDER BY ts_ms", conn, params=params))
+
+    parts = [part for part in parts if len(part)] or parts[-1:]
+    df = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+    # rows of a day that is archived but not yet deleted show up twice
+    df = df.drop_duplicates('id', keep='last').sort_values('ts_ms', kind='stable').reset_index(drop=True)
+    df = df.astype({metric: float for metric in columns[3:]})
+
+    df['timestamp'] = to_local_time(df['ts_ms'])
+    return df
+
+
+# === MAIN ===
+def main():
+    parser = argparse.ArgumentParser(description="Move closed days from sensor_data.db into the Parquet archive")
+    parser.add_argument("--db", default=DB_NAME, help="database (default: sensor_data.db)")
+    parser.add_argument("--dir", default=ARCHIVE_DIR, help="archive directory (default: archive/)")
+    parser.add_argument("--keep-days", type=int, default=HOT_DAYS, help="closed days kept in the database")
+    args = parser.parse_args()
+
+    setup_logging(None)
+    conn = connect(args.db)
+    init_db(conn)
+    archived = archive_days(conn, args.keep_days, args.dir)
+    conn.close()
+    print(f"{archived} rows archived")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import threading
+from datetime import datetime, timedelta
+
+MERGE_WINDOW = 10       # s, messages of one node within this time form one reading (sender cycle is 30 s)
+TICK = 1.0              # s, how often MergingSink hands on readings whose window has passed
+
+# sensor -> metrics of its message (sender/src/main.c sends one payload per sensor and cycle)
+SENSOR_GROUPS = {
+    'SCD41': {'co2', 'temperature', 'humidity'},
+    'CCS811': {'eco2', 'tvoc'},
+    'SPS30': {'pm_2_5', 'pm_10_0', 'typical_particle_size'},
+}
+
+
+def sensors_of(sensor_data):
+    return {sensor for sensor, metrics in SENSOR_GROUPS.items() if metrics & sensor_data.keys()}
+
+
+class ReadingMerger:
+    """
+    Groups the per-sensor messages of one node (gateway) into complete readings.
+
+    Assumes one sender per receiver: the receiver prints the sender's payload without its
+    address and the payloads carry no node id, so the gateway is the only key. Two senders on
+    one receiver would have their messages merged into the same readings.
+
+    A reading starts with the first message of a node and takes the time of that message.
+    It is complete, and handed on right away, once every sensor expected from the node is in
+    (all SENSOR_GROUPS at first). Otherwise it is handed on as it is, missing sensors stay None:
+    - when window seconds have passed since its first message (sensor failed or error payload)
+    - when a second message of a sensor already in the reading arrives (next cycle started)
+    After such a partial reading only the sensors it had are expected, so a failed sensor delays
+    one reading; a sensor that reports again is expected again.
+    A late message, arriving after its reading was handed on, starts the next reading.
+    Full frames with all sensors (serial_log.txt format) pass straight through.
+    Time comes from the callers (arrival or logged time), so the merger itself has no clock.
+    """
+
+    def __init__(self, window=MERGE_WINDOW):
+        self.window = timedelta(seconds=window)
+        self.open = {}          # gateway -> [received, merged data, sensors]
+        self.expected = {}      # gateway -> sensors expected in a complete reading
+
+    def add(self, received, sensor_data, gateway=None):
+        """Add one parsed message, returns the readings [(received, data, gateway)] completed by it"""
+        done = []
+        sensors = sensors_of(sensor_data)
+        expected = self.expected.setdefault(gateway, set(SENSOR_GROUPS))
+        expected |= sensors
+
+        reading = self.open.get(gateway)
+        if reading is not None and (reading[2] & sensors or received - reading[0] > self.window):
+            done.append(self._close(gateway, partial=True))
+            reading = None
+        if reading is None:
+            reading = self.open[gateway] = [received, {}, set()]
+        reading[1].update(sensor_data)
+        reading[2] |= sensors
+
+        if reading[2] >= self.expected[gateway]:
+            done.append(self._close(gateway))
+        return done
+
+    def expire(self, now):
+        """Partial readings whose window has passed at now"""
+        return [self._close(gateway, partial=True)
+                for gateway, reading in list(self.open.items()) if now - reading[0] > self.window]
+
+    def flush(self):
+        return [self._close(gateway, partial=True) for gateway in list(self.open)]
+
+    def _close(self, gateway, partial=False):
+        received, data, sensors = self.open.pop(gateway)
+        if partial and sensors:
+            self.expected[gateway] = set(sensors)
+        return received, data, gateway
+
+
+class MergingSink:
+    """
+    Collector side: merges the messages of all reader threads (same put() as SensorDBWriter)
+    and hands complete readings to the writer. A timer thread hands on expired readings.
+    """
+
+    def __init__(self, writer, window=MERGE_WINDOW, tick=TICK, clock=datetime.now):
+        self.writer = writer
+        self.merger = ReadingMerger(window)
+        self.tick = tick
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="merger", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def put(self, received, sensor_data, gateway=None):
+        with self.lock:
+            done = self.merger.add(received, sensor_data, gateway)
+        for reading in done:
+            self.writer.put(*reading)
+        return True
+
+    def _run(self):
+        while not self.stop.wait(self.tick):
+            with self.lock:
+                done = self.merger.expire(self.clock())
+            for reading in done:
+                self.writer.put(*reading)
+
+    def close(self):
+        # hand on the open readings, the writer is closed by the caller afterwards
+        self.stop.set()
+        self.thread.join()
+        with self.lock:
+            done = self.merger.flush()
+        for reading in done:
+            self.writer.put(*reading)
@@ -0,0 +1,245 @@
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from sensorDataCollector import collect_port, start_writer
+from readingMerger import MergingSink
+from collectorLog import setup_logging
+
+LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serial_log.txt")
+REPLAY_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replay_data.db")
+LOG_PREFIX = re.compile(rb"^(\d{4})-(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d),(\d{3}) - ")
+SEND_INTERVAL = 30      # s, SLEEP_TIME_MS of the sender
+MAX_CHUNK = 4096        # bytes handed out per read at maximum rate
+
+# metric -> (start value, unit, random walk step, lower bound); values/units as in serial_log.txt
+SYNTHETIC_METRICS = {
+    'co2': (420.0, 'ppm', 5.0, 350.0),
+    'temperature': (23.0, 'C', 0.05, -10.0),
+    'humidity': (40.0, '%', 0.2, 0.0),
+    'eco2': (400.0, 'ppm', 5.0, 400.0),
+    'tvoc': (5.0, 'ppb', 1.0, 0.0),
+    'pm_1_0': (1.6, 'mg/m^3', 0.1, 0.0),
+    'pm_2_5': (2.1, 'mg/m^3', 0.1, 0.0),
+    'pm_10_0': (2.4, 'mg/m^3', 0.1, 0.0),
+    'pm_4_0': (2.4, 'mg/m^3', 0.1, 0.0),
+    'pm_0_5': (9.9, 'mg/m^3', 0.5, 0.0),
+    'pm_1_0_nc': (12.3, '/cm^3', 0.5, 0.0),
+    'pm_2_5_nc': (12.7, '/cm^3', 0.5, 0.0),
+    'pm_4_0_nc': (12.8, '/cm^3', 0.5, 0.0),
+    'pm_10_0_nc': (12.8, '/cm^3', 0.5, 0.0),
+    'typical_particle_size': (0.68, 'µm', 0.01, 0.0),
+}
+
+
+# === SOURCES ===
+def log_chunks(path=LOG_FILE, loops=1):
+    """
+    (logged time in s, raw bytes) per line of a collector log like serial_log.txt,
+    the "YYYY-MM-DD HH:MM:SS,mmm - " prefix stripped. Lines are streamed, so memory stays
+    constant. Every further loop is shifted by the duration of the log.
+    """
+    offset = 0.0
+    for _ in range(loops):
+        first = last = None
+        with open(path, "rb") as f:
+            for line in f:
+                match = LOG_PREFIX.match(line)
+                if not match:
+                    continue
+                year, month, day, hour, minute, second, ms = map(int, match.groups())
+                t = datetime(year, month, day, hour, minute, second, ms * 1000).timestamp()
+                first = t if first is None else first
+                last = t
+                yield t + offset, line[match.end():]
+        if first is not None:
+            offset += last - first + SEND_INTERVAL
+
+def synthetic_chunks(node=0, frames=None, interval=SEND_INTERVAL):
+    """
+    Synthetic receiver output of one node: a full JSON frame (values with units, like
+    serial_log.txt) every interval seconds, values doing a random walk. frames=None is endless.
+    """
+    rng = random.Random(node)  # reproducible per node
+    values = {metric: start * rng.uniform(0.9, 1.1) for metric, (start, _, _, _) in SYNTHETIC_METRICS.items()}
+    t = time.time()
+    sent = 0
+    while frames is None or sent < frames:
+        payload = {}
+        for metric, (_, unit, step, low) in SYNTHETIC_METRICS.items():
+            values[metric] = max(low, values[metric] + rng.gauss(0, step))
+            payload[metric] = f"{values[metric]:.6f}"
+            payload[f"{metric}_unit"] = unit
+        yield t, (json.dumps(payload, ensure_ascii=False) + "\n").encode()
+        t += interval
+        sent += 1
+
+
+class ReplaySerial:
+    """
+    Stand-in for serial.Serial (read, in_waiting, timeout, context manager) that hands out
+    the bytes of a source (log_chunks/synthetic_chunks) paced by their timestamps.
+    speed 1 = real time, N = N times faster, 0 = as fast as the reader takes them.
+    exhausted is set once the source ended and all bytes were read.
+    """
+
+    def __init__(self, chunks, speed=1.0, timeout=1.0):
+        self.chunks = iter(chunks)
+        self.speed = speed
+        self.timeout = timeout
+        self.buffer = bytearray()
+        self.pending = None     # next (t, data) that is not due yet
+        self.t0 = None          # source time of the first chunk
+        self.start = None       # monotonic time the first chunk was handed out
+        self.finished = False
+        self.sent = 0           # bytes handed out
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass    # the source keeps its position, a reopen (reconnect) continues the replay
+
+    @property
+    def exhausted(self):
+        return self.finished and not self.buffer and self.pending is None
+
+    def _due(self, t):
+        if self.t0 is None:
+            self.t0, self.start = t, time.monotonic()
+        return self.start + (t - self.t0) / self.speed if self.speed else 0.0
+
+    def _fill(self, wait):
+        """Move all due chunks into the buffer, waits up to wait seconds if nothing is due"""
+        deadline = time.monotonic() + wait
+        while len(self.buffer) < MAX_CHUNK:
+            if self.pending is None:
+                self.pending = next(self.chunks, None)
+                if self.pending is None:
+                    self.finished = True
+                    break
+            t, data = self.pending
+            delay = self._due(t) - time.monotonic()
+            if delay > 0:
+                if self.buffer or time.monotonic() + delay > deadline:
+                    break
+                time.sleep(delay)
+            self.buffer += data
+            self.pending = None
+
+        if not self.buffer:
+            time.sleep(max(0.0, deadline - time.monotonic()))
+
+    @property
+    def in_waiting(self):
+        self._fill(0)
+        return len(self.buffer)
+
+    def read(self, size=1):
+        if not self.buffer:
+            self._fill(self.timeout)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        self.sent += len(data)
+        return data
+
+
+# === PSEUDO-TERMINAL ===
+def serve_pty(source):
+    """
+    Write a ReplaySerial into a new pseudo-terminal, the real collector can read it
+    like a receiver: python sensorDataCollector.py <device>. Returns (device, thread).
+    """
+    import tty
+    master, slave = os.openpty()
+    tty.setraw(slave)   # no echo or newline translation
+
+    def pump():
+        while not source.exhausted:
+            data = source.read(MAX_CHUNK)
+            if data:
+                os.write(master, data)
+
+    thread = threading.Thread(target=pump, daemon=True)
+    thread.start()
+    return os.ttyname(slave), thread
+
+
+# === IN-PROCESS REPLAY ===
+def replay(sources, db_name=REPLAY_DB, verbose=False):
+    """
+    Feed gateway -> ReplaySerial through the collector's reader threads, merger and writer,
+    returns when all sources are exhausted and written. Prints the ingest rate.
+    """
+    writer = start_writer(db_name)
+    merger = MergingSink(writer).start()
+    stops = {gateway: threading.Event() for gateway in sources}
+    threads = [
+        threading.Thread(target=collect_port, args=(gateway, merger, stops[gateway]),
+                         kwargs={"open_port": sources.get, "verbose": verbose}, daemon=True)
+        for gateway in sources
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+
+    while not all(source.exhausted for source in sources.values()):
+        time.sleep(0.05)
+    for stop in stops.values():
+        stop.set()
+    for thread in threads:
+        thread.join()
+    merger.close()
+    writer.close()
+    elapsed = time.perf_counter() - started
+
+    sent = sum(source.sent for source in sources.values())
+    print(f"Replayed {sent / 1e6:.1f} MB from {len(sources)} source(s) in {elapsed:.2f} s: "
+          f"{writer.written} records written ({writer.written / elapsed:.0f} records/s), {writer.dropped} dropped")
+    return writer.written, elapsed
+
+
+# === MAIN ===
+def main():
+    parser = argparse.ArgumentParser(description="Replay serial_log.txt or synthetic nodes into the collector")
+    parser.add_argument("--log", default=LOG_FILE, help="receiver log to replay (default: serial_log.txt)")
+    parser.add_argument("--loops", type=int, default=1, help="replay the log this many times")
+    parser.add_argument("--synthetic", action="store_true", help="generate synthetic frames instead of the log")
+    parser.add_argument("--frames", type=int, default=1000, help="synthetic frames per node")
+    parser.add_argument("--nodes", type=int, default=1, help="number of simulated gateways")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = real time, N = N times faster, 0 = maximum rate")
+    parser.add_argument("--db", default=REPLAY_DB, help="database to write (default: replay_data.db)")
+    parser.add_argument("--pty", action="store_true", help="serve pseudo-terminals for the real collector instead")
+    parser.add_argument("--verbose", action="store_true", help="print every received record")
+    args = parser.parse_args()
+    # console only, error.log belongs to the real collector; records are logged at DEBUG
+    setup_logging(None, logging.DEBUG if args.verbose else logging.INFO)
+
+    sources = {}
+    for node in range(args.nodes):
+        if args.synthetic:
+            chunks = synthetic_chunks(node, frames=args.frames)
+        else:
+            chunks = log_chunks(args.log, loops=args.loops)
+        sources[f"replay-{node}"] = ReplaySerial(chunks, speed=args.speed, timeout=0.1)
+
+    if args.pty:
+        served = [serve_pty(source) for source in sources.values()]
+        print("Run: python sensorDataCollector.py", " ".join(device for device, _ in served))
+        for _, thread in served:
+            thread.join()
+        input("Replay finished, press Enter to close the pseudo-terminals")
+    else:
+        replay(sources, args.db, verbose=args.verbose)
+
+
+if __name__ == "__main__":
+    main()
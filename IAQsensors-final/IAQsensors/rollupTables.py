@@ -0,0 +1,147 @@
+import pandas as pd
+from parquetArchive import load_range
+from sensorDatabase import DAY_MS, METRICS, ROW_COLUMNS, to_local_time
+
+# rollup tables and their bucket size in ms, from fine to coarse
+RESOLUTIONS = {
+    'rollup_1m': 60 * 1000,
+    'rollup_1h': 60 * 60 * 1000,
+    'rollup_1d': DAY_MS,
+}
+# derived values with rollups as well (comfort_band is a category, no mean)
+ROLLUP_DERIVED = ['humidex', 'dew_point', 'absolute_humidity']
+ROLLUP_METRICS = METRICS + ROLLUP_DERIVED
+RAW_INTERVAL = 5 * 1000   # ms, sender cadence, used to estimate the raw row count of a range
+
+def create_rollup_tables(conn):
+    # one row per metric and bucket (bucket_ms = start of the bucket, UTC aligned)
+    for table in RESOLUTIONS:
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                metric TEXT,
+                bucket_ms INTEGER,
+                min REAL,
+                max REAL,
+                sum REAL,
+                count INTEGER,
+                PRIMARY KEY (metric, bucket_ms)
+            ) WITHOUT ROWID
+        ''')
+    conn.commit()
+
+def _upsert_sql(table):
+    return f'''
+        INSERT INTO {table} (metric, bucket_ms, min, max, sum, count) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (metric, bucket_ms) DO UPDATE SET
+            min = MIN(min, excluded.min),
+            max = MAX(max, excluded.max),
+            sum = sum + excluded.sum,
+            count = count + excluded.count
+    '''
+
+UPSERT_SQL = {table: _upsert_sql(table) for table in RESOLUTIONS}
+
+def update_rollups(conn, rows):
+    """
+    Writer batch hook: fold a batch of new readings (rows as built by reading_row) into all
+    rollup tables. Aggregates the batch in memory first, so one upsert per metric and bucket.
+    Runs inside the writer's transaction.
+    """
+    ts_index = ROW_COLUMNS.index('ts_ms')
+    metric_index = [(metric, ROW_COLUMNS.index(metric)) for metric in ROLLUP_METRICS]
+
+    for table, size in RESOLUTIONS.items():
+        buckets = {}
+        for row in rows:
+            bucket_ms = row[ts_index] - row[ts_index] % size
+            for metric, i in metric_index:
+                value = row[i]
+                if not isinstance(value, (int, float)):
+                    continue
+                agg = buckets.get((metric, bucket_ms))
+                if agg is None:
+                    buckets[(metric, bucket_ms)] = [value, value, value, 1]
+                else:
+                    agg[0] = min(agg[0], value)
+                    agg[1] = max(agg[1], value)
+                    agg[2] += value
+                    agg[3] += 1
+        conn.executemany(UPSERT_SQL[table], [key + tuple(agg) for key, agg in buckets.items()])
+
+def rebuild_rollups(conn, start_ms=None, end_ms=None, metrics=ROLLUP_METRICS):
+    """
+    Rebuild the rollups from readings (1-min from raw, coarser ones from the finer table).
+    With start_ms/end_ms only the days touching that range are rebuilt (e.g. after a bulk import),
+    with metrics only those metrics (e.g. a new derived column).
+    """
+    in_metrics = "metric IN (" + ", ".join(f"'{metric}'" for metric in metrics) + ")"
+    day = max(RESOLUTIONS.values())
+    if start_ms is None:
+        start_ms, end_ms = -2 ** 62, 2 ** 62
+    else:
+        # whole coarsest buckets, so every level is rebuilt from complete finer buckets
+        start_ms, end_ms = start_ms - start_ms % day, end_ms - end_ms % day + day
+
+    finer = None
+    for table, size in RESOLUTIONS.items():
+        conn.execute(f"DELETE FROM {table} WHERE bucket_ms >= ? AND bucket_ms < ? AND {in_metrics}", (start_ms, end_ms))
+        if finer is None:
+            for metric in metrics:
+                conn.execute(f'''
+                    INSERT INTO {table} (metric, bucket_ms, min, max, sum, count)
+                    SELECT '{metric}', ts_ms - ts_ms % {size}, MIN({metric}), MAX({metric}), SUM({metric}), COUNT({metric})
+                    FROM readings
+                    WHERE ts_ms >= ? AND ts_ms < ? AND {metric} IS NOT NULL
+                    GROUP BY ts_ms - ts_ms % {size}
+                ''', (start_ms, end_ms))
+        else:
+            conn.execute(f'''
+                INSERT INTO {table} (metric, bucket_ms, min, max, sum, count)
+                SELECT metric, bucket_ms - bucket_ms % {size}, MIN(min), MAX(max), SUM(sum), SUM(count)
+                FROM {finer}
+                WHERE bucket_ms >= ? AND bucket_ms < ? AND {in_metrics}
+                GROUP BY metric, bucket_ms - bucket_ms % {size}
+            ''', (start_ms, end_ms))
+        conn.commit()
+        finer = table
+
+def choose_resolution(start_ms, end_ms, max_points=1000):
+    """Finest source with at most max_points per metric: None (raw readings) or a rollup table"""
+    span = max(end_ms - start_ms, 1)
+    if span / RAW_INTERVAL <= max_points:
+        return None
+    for table, size in RESOLUTIONS.items():
+        if span / size <= max_points:
+            return table
+    return list(RESOLUTIONS)[-1]
+
+def query_history(conn, metrics, start_ms, end_ms, max_points=1000, gateway=None):
+    """
+    Readings of metrics in [start_ms, end_ms) at the resolution picked by choose_resolution.
+    Returns (resolution, DataFrame) with columns ts_ms, timestamp and per metric the mean
+    ({metric}) plus {metric}_min / {metric}_max (equal to the value for raw readings).
+    gateway only filters raw readings, the rollup tables aggregate all gateways.
+    """
+    metrics = [metric for metric in metrics if metric in ROLLUP_METRICS]
+    resolution = choose_resolution(start_ms, end_ms, max_points)
+    if resolution is None:
+        # archived days are read from their Parquet partitions
+        df = load_range(conn, start_ms, end_ms, metrics, gateway)[['ts_ms'] + metrics]
+        for metric in metrics:
+            df[f"{metric}_min"] = df[metric]
+            df[f"{metric}_max"] = df[metric]
+    else:
+        placeholders = ", ".join(["?"] * len(metrics))
+        long_df = pd.read_sql_query(
+            f'''SELECT metric, bucket_ms AS ts_ms, min, max, sum / count AS mean
+                FROM {resolution}
+                WHERE metric IN ({placeholders}) AND bucket_ms >= ? AND bucket_ms < ?''',
+            conn, params=(*metrics, start_ms - start_ms % RESOLUTIONS[resolution], end_ms)
+        )
+        df = long_df.pivot(index='ts_ms', columns='metric', values=['mean', 'min', 'max'])
+        df.columns = [metric if stat == 'mean' else f"{metric}_{stat}" for stat, metric in df.columns]
+        columns = [f"{metric}{suffix}" for metric in metrics for suffix in ("", "_min", "_max")]
+        df = df.reindex(columns=columns).reset_index().sort_values('ts_ms')
+
+    df['timestamp'] = to_local_time(df['ts_ms'])
+    return resolution, df
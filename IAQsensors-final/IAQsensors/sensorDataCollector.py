@@ -1,60 +1,35 @@
+import json
+import logging
 import serial
-import sqlite3
+import sys
+import threading
 import time
-from datetime import datetime
-from findActivePort import find_active_port
+from findActivePort import PortWatcher, find_active_ports, gateway_id
+from frameReader import read_frames
+from sensorDatabase import DB_NAME, connect, init_db
+from sensorWriter import SensorDBWriter
+from rollupTables import update_rollups
+from onlineStats import StatsEngine
+from dataRetention import start_maintenance
+from alertEngine import AlertEngine
+from collectorMetrics import CollectorMetrics, start_metrics, write_snapshot
+from readingMerger import MergingSink
+from collectorLog import LOG_FILE, setup_logging
+
+log = logging.getLogger(__name__)
 
 # === CONFIGURATION ===
-SERIAL_PORT = find_active_port()
-if not SERIAL_PORT:
-    raise Exception("No active serial port found. Please connect the sensor and try again.")
 BAUDRATE = 115200
-DB_NAME = 'sensor_data.db' 
-
-# === CONNECT TO DATABASE ===
-conn = sqlite3.connect(DB_NAME)
-cursor = conn.cursor()
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS sensor_readings (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    timestamp TEXT,
-    co2 REAL,
-    co2_unit TEXT,
-    temperature REAL,
-    temperature_unit TEXT,
-    humidity REAL,
-    humidity_unit TEXT,
-    eco2 REAL,
-    eco2_unit TEXT,
-    tvoc REAL,
-    tvoc_unit TEXT,
-    pm_2_5 REAL,
-    pm_2_5_unit TEXT,
-    pm_10_0 REAL,
-    pm_10_0_unit TEXT,
-    pm_0_5 REAL,
-    pm_0_5_unit TEXT,
-    pm_1_0 REAL,
-    pm_1_0_unit TEXT,
-    pm_4_0 REAL,
-    pm_4_0_unit TEXT,
-    pm_1_0_nc REAL,
-    pm_1_0_nc_unit TEXT,
-    pm_2_5_nc REAL,
-    pm_2_5_nc_unit TEXT,
-    pm_4_0_nc REAL,
-    pm_4_0_nc_unit TEXT,
-    pm_10_0_nc REAL,
-    pm_10_0_nc_unit TEXT,
-    typical_particle_size REAL,
-    typical_particle_size_unit TEXT
-)
-''')
-conn.commit()
-
-cursor.execute("SELECT * FROM sensor_readings LIMIT 10")  # Adjust as needed
-sensor_data = cursor.fetchall()
+RECONNECT_DELAY = 1  # s, wait before reopening a port after a read error
+# short keys of the sender's per-sensor payloads -> column names
+COMPACT_KEYS = {
+    'temp': 'temperature',
+    'humi': 'humidity',
+    'pm25': 'pm_2_5',
+    'pm10': 'pm_10_0',
+    'typ': 'typical_particle_size',
+}
+
 # === PARSE SENSOR LOG FUNCTION ===
 def parse_sensor_data(lines):
     data = {}
@@ -62,7 +37,7 @@ def parse_sensor_data(lines):
         try:
             line = line.strip().strip(',')
             if not line or ":" not in line:
-                print(f"Skipping invalid line: {line}")
+                log.warning(f"Skipping invalid line: {line}")
                 continue
             pollutant, value =line.split(":", 1)
             pollutant = pollutant.strip().strip('"')
@@ -72,66 +47,156 @@ def parse_sensor_data(lines):
             except ValueError:
                 data[pollutant] = value
         except Exception as e:
-            print(f"Error parsing line '{line}': {e}")
+            log.warning(f"Error parsing line '{line}': {e}")
             continue
     return data
 
-# === SERIAL INITIALIZATION ===
-ser = serial.Serial(SERIAL_PORT, BAUDRATE, timeout=1)
-print("Listening on", SERIAL_PORT)
+# === PARSE JSON FRAME FUNCTION ===
+def parse_frame(frame, on_error=None):
+    """
+    Parse one { ... } frame from the FrameReader into a dict.
+    Compact payloads ({"co2":575,"temp":"22.1",...}) are parsed as JSON (short keys renamed),
+    anything else line by line.
+    Error payloads like {"error":"SCD41 read failed: -5"} are rejected (None), on_error(message)
+    is called for them.
+    """
+    try:
+        raw = json.loads(frame)
+    except ValueError:
+        raw = None
+
+    if isinstance(raw, dict):
+        data = {}
+        for pollutant, value in raw.items():
+            pollutant = COMPACT_KEYS.get(pollutant, pollutant)
+            try:
+                data[pollutant] = float(value)
+            except (TypeError, ValueError):
+                data[pollutant] = value
+    else:
+        data = parse_sensor_data(frame.strip().strip('{}').splitlines())
+
+    if "error" in data:
+        log.warning(f"Rejected error payload: {data['error']}")
+        if on_error is not None:
+            on_error(data['error'])
+        return None
+    return data
+
+# === GATEWAY READER ===
+def open_serial(serial_port):
+    return serial.Serial(serial_port, BAUDRATE, timeout=1)
+
+def collect_port(serial_port, writer, stop, open_port=open_serial, verbose=True, metrics=None, gateway=None):
+    """
+    Reader thread of one gateway: frames -> records tagged with the gateway -> shared writer.
+    open_port(serial_port) returns the serial-like source (replaySource.ReplaySerial for replays).
+    metrics: collectorMetrics.CollectorMetrics, counts frames, failures and reconnects.
+    gateway: name the records and counters are tagged with (findActivePort.gateway_id),
+    default the port itself.
+    """
+    gateway = gateway or serial_port
+    on_error = metrics.error_payload if metrics is not None else None
+    opened = False
+    while not stop.is_set():
+        try:
+            # === SERIAL INITIALIZATION ===
+            if opened and metrics is not None:
+                metrics.reconnect(gateway)
+            opened = True
+            with open_port(serial_port) as ser:
+                log.info(f"Listening on {serial_port}")
+
+                # records are handed on as soon as their closing brace arrives
+                for received, frame in read_frames(ser, stop=stop):
+                    sensor_data = parse_frame(frame, on_error)
+                    if verbose:
+                        log.debug(f"Received data ({gateway}): {sensor_data}")
+                    if metrics is not None:
+                        metrics.frame(gateway)
+                        if sensor_data is not None and not sensor_data:
+                            metrics.parse_failure(gateway)
+                    if not sensor_data:
+                        continue
+
+                    writer.put(received, sensor_data, gateway=gateway)
+
+        except Exception as e:
+            log.error(f"Error reading {serial_port}: {e}")
+            stop.wait(RECONNECT_DELAY)
+    log.info(f"Stopped reading {serial_port}")
+
+# === WRITER ===
+def start_writer(db_name=DB_NAME, metrics=None):
+    # create the table and apply pending schema migrations before writing
+    conn = connect(db_name)
+    init_db(conn)
+    stats = StatsEngine()       # merges into the stored statistics
+    alerts = AlertEngine(conn)  # knows the alerts that are still active
+    conn.close()
+
+    # records are written in batches by a background thread, rollups, statistics and alerts are updated per batch
+    return SensorDBWriter(db_name, on_batch=[update_rollups, stats, alerts], metrics=metrics).start()
 
 # === MAIN LOOP ===
-while True:
+def main(ports=None):
+    """ports: explicit devices (e.g. the pty of a replay), skips discovery and hot-plug"""
+    # records (DEBUG) on the console only, error.log (rotated at 1 MB, System Health page) from INFO on
+    setup_logging(LOG_FILE, logging.DEBUG)
+    # cached port(s) first, otherwise all USB ports are probed concurrently
+    serial_ports = list(ports) if ports else find_active_ports()
+    if not serial_ports:
+        log.warning("No active serial port found. Waiting for a sensor to be connected...")
+
+    # counters of readers and writer, a snapshot every 10 s goes to collector_metrics (System Health page)
+    metrics = CollectorMetrics()
+    writer = start_writer(DB_NAME, metrics)
+    metrics.writer = writer
+    metrics.queue_depth = writer.queue.qsize
+    reporter = start_metrics(metrics, DB_NAME)
+    # the sender reports every sensor separately, readers feed the merger, the merger the writer
+    merger = MergingSink(writer).start()
+    maintenance = start_maintenance(DB_NAME)   # archive, retention and incremental vacuum, once an hour
+
+    # one reader thread per gateway, all feeding the same merger
+    readers = {}    # device -> stop event of its reader thread
+
+    def attach(device):
+        stop = threading.Event()
+        readers[device] = stop
+        # tagged with the USB identity, a re-plugged receiver (ttyACM0 -> ttyACM1) stays the same gateway
+        gateway = gateway_id(device)
+        threading.Thread(target=collect_port, args=(device, merger, stop),
+                         kwargs={"metrics": metrics, "gateway": gateway}, name=f"reader {gateway}", daemon=True).start()
+
+    def detach(device):
+        stop = readers.pop(device, None)
+        if stop:
+            stop.set()
+
+    for device in serial_ports:
+        attach(device)
+
     try:
-        lines = []
-        while True:
-            line = ser.readline().decode(errors='ignore').strip()
-            print(line)  # Debug print
-            if not line:
-                break
-            lines.append(line)
-
-        sensor_data = parse_sensor_data(lines)
-
-        print("Received data:", sensor_data)
-
-        if sensor_data:
-            #add timestamp 
-            timestamp = datetime.now().isoformat()
-
-            # prepare data for database insertion
-            fields = [
-                'co2', 'co2_unit', 'temperature', 'temperature_unit', 'humidity', 'humidity_unit',
-                'eco2', 'eco2_unit', 'tvoc', 'tvoc_unit',
-                'pm_2_5', 'pm_2_5_unit', 'pm_10_0', 'pm_10_0_unit',
-                'pm_0_5', 'pm_0_5_unit', 'pm_1_0', 'pm_1_0_unit', 'pm_4_0', 'pm_4_0_unit',
-                'pm_1_0_nc', 'pm_1_0_nc_unit', 'pm_2_5_nc', 'pm_2_5_nc_unit',
-                'pm_4_0_nc', 'pm_4_0_nc_unit', 'pm_10_0_nc', 'pm_10_0_nc_unit',
-                'typical_particle_size', 'typical_particle_size_unit'
-            ]
-
-            # Ensure all fields are present, filling missing ones with None
-            for field in fields:
-                if field not in sensor_data:
-                    sensor_data[field] = None
-
-            values = [sensor_data.get(field) for field in fields]
-
-            #send data to database
-            cursor.execute(f'''
-                INSERT INTO sensor_readings (
-                    timestamp, {", ".join(fields)}
-                ) VALUES (
-                    ?, {", ".join(["?"] * len(fields))}
-                )
-            ''', [timestamp] + values)
-            conn.commit()
-            print(f"[{timestamp}] Data saved.")
-
-        #wait 5s before next reading
-        time.sleep(5)
-
-    except Exception as e:
-        print("Error in main loop:", e)
-        time.sleep(5)
-        
\ No newline at end of file
+        if ports:
+            while True:
+                time.sleep(1)
+        else:
+            # hot-plug: re-attaches unplugged/new receivers without restarting the collector
+            PortWatcher(on_attach=attach, on_detach=detach, active=serial_ports).run()
+    finally:
+        for device in list(readers):
+            detach(device)
+        maintenance.set()
+        merger.close()  # hand on the open readings before the writer flushes
+        writer.close()  # flush pending records on shutdown
+        reporter.set()
+        conn = connect(DB_NAME)
+        write_snapshot(conn, metrics)   # final counters
+        conn.close()
+        log.info(f"Writer stopped, {writer.written} records saved.")
+
+
+if __name__ == "__main__":
+    # python sensorDataCollector.py [port ...]
+    main(sys.argv[1:])
@@ -0,0 +1,373 @@
+import logging
+import sqlite3
+from datetime import datetime
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+DB_NAME = 'sensor_data.db'
+DAY_MS = 24 * 60 * 60 * 1000     # days are UTC aligned (rollups, archive partitions, retention)
+WAL_SIZE_LIMIT = 16 * 1024 * 1024   # bytes
+
+# value columns of readings, units are kept once per metric in metric_units
+METRICS = [
+    'co2', 'temperature', 'humidity', 'eco2', 'tvoc',
+    'pm_2_5', 'pm_10_0', 'pm_0_5', 'pm_1_0', 'pm_4_0',
+    'pm_1_0_nc', 'pm_2_5_nc', 'pm_4_0_nc', 'pm_10_0_nc',
+    'typical_particle_size'
+]
+
+# columns computed once per reading at ingest (see derivedMetrics), comfort_band is the humidex band
+DERIVED = ['humidex', 'dew_point', 'absolute_humidity', 'comfort_band']
+
+# layout of the rows built by reading_row (and handed to the writer's batch hooks)
+ROW_COLUMNS = ['timestamp', 'ts_ms', 'gateway'] + METRICS + DERIVED
+
+# built once so sqlite3 can reuse the cached prepared statements for every batch
+INSERT_SQL = f'''
+    INSERT INTO readings (
+        {", ".join(ROW_COLUMNS)}
+    ) VALUES (
+        {", ".join(["?"] * len(ROW_COLUMNS))}
+    )
+'''
+UNIT_SQL = "INSERT OR REPLACE INTO metric_units (metric, unit) VALUES (?, ?)"
+# imports of old logs never replace a unit the collector already stored
+IMPORT_UNIT_SQL = "INSERT OR IGNORE INTO metric_units (metric, unit) VALUES (?, ?)"
+
+def connect(db_name=DB_NAME, check_same_thread=True):
+    """
+    Open a connection with WAL journaling, so the Streamlit pages can keep reading
+    while the collector writes (readers and the writer no longer block each other).
+    """
+    conn = sqlite3.connect(db_name, timeout=10, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode=WAL")    # persistent, stored in the db file
+    conn.execute("PRAGMA synchronous=NORMAL")  # safe with WAL, fsync only on checkpoint
+    conn.execute(f"PRAGMA journal_size_limit={WAL_SIZE_LIMIT}")    # WAL file is truncated back after checkpoints
+    return conn
+
+# === DATABASE SCHEMA ===
+# original (version 0) layout, later versions are reached through MIGRATIONS
+def create_table(cursor):
+    cursor.execute('''
+CREATE TABLE IF NOT EXISTS sensor_readings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT,
+    co2 REAL,
+    co2_unit TEXT,
+    temperature REAL,
+    temperature_unit TEXT,
+    humidity REAL,
+    humidity_unit TEXT,
+    eco2 REAL,
+    eco2_unit TEXT,
+    tvoc REAL,
+    tvoc_unit TEXT,
+    pm_2_5 REAL,
+    pm_2_5_unit TEXT,
+    pm_10_0 REAL,
+    pm_10_0_unit TEXT,
+    pm_0_5 REAL,
+    pm_0_5_unit TEXT,
+    pm_1_0 REAL,
+    pm_1_0_unit TEXT,
+    pm_4_0 REAL,
+    pm_4_0_unit TEXT,
+    pm_1_0_nc REAL,
+    pm_1_0_nc_unit TEXT,
+    pm_2_5_nc REAL,
+    pm_2_5_nc_unit TEXT,
+    pm_4_0_nc REAL,
+    pm_4_0_nc_unit TEXT,
+    pm_10_0_nc REAL,
+    pm_10_0_nc_unit TEXT,
+    typical_particle_size REAL,
+    typical_particle_size_unit TEXT
+)
+''')
+
+# === SCHEMA MIGRATIONS ===
+# migrations are applied in order, PRAGMA user_version holds the number already applied
+DELETE_BATCH = 5000     # rows per transaction of delete_batched
+BACKFILL_CHUNK = 5000
+
+def _add_ts_ms(conn):
+    """v1: integer epoch-millisecond time column with index, backfilled from the ISO timestamp"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(sensor_readings)")]
+    if 'ts_ms' not in columns:
+        conn.execute("ALTER TABLE sensor_readings ADD COLUMN ts_ms INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sensor_readings_ts_ms ON sensor_readings (ts_ms)")
+    conn.commit()
+
+    # backfill in chunks with a commit each, so the collector is never locked out for long
+    # and an interrupted migration simply continues where it stopped
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, timestamp FROM sensor_readings WHERE id > ? AND ts_ms IS NULL ORDER BY id LIMIT ?",
+            (last_id, BACKFILL_CHUNK)
+        ).fetchall()
+        if not rows:
+            break
+        updates = []
+        for row_id, timestamp in rows:
+            try:
+                updates.append((to_epoch_ms(datetime.fromisoformat(timestamp)), row_id))
+            except (TypeError, ValueError):
+                log.warning(f"Skipping row {row_id} with invalid timestamp: {timestamp}")
+        conn.executemany("UPDATE sensor_readings SET ts_ms = ? WHERE id = ?", updates)
+        conn.commit()
+        last_id = rows[-1][0]
+
+def _create_compat_view(conn):
+    """
+    sensor_readings view with the original column layout (value, unit, value, unit, ...),
+    units are joined from metric_units, so SELECT * and get_unit_mapping keep working.
+    Built from the current readings columns, later migrations call it again after adding columns.
+    """
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(readings)")]
+    select = []
+    for column in columns:
+        select.append(f"r.{column}")
+        if column in METRICS:
+            select.append(f"u.{column}_unit")
+    units = ", ".join(f"MAX(CASE WHEN metric = '{m}' THEN unit END) AS {m}_unit" for m in METRICS)
+
+    conn.execute("DROP VIEW IF EXISTS sensor_readings")
+    conn.execute(f'''
+        CREATE VIEW sensor_readings AS
+        SELECT {", ".join(select)}
+        FROM readings r
+        CROSS JOIN (SELECT {units} FROM metric_units) u
+    ''')
+
+def _normalize_units(conn):
+    """v2: move values to the compact readings table, units to the metric_units dictionary"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS metric_units (
+            metric TEXT PRIMARY KEY,
+            unit TEXT
+        )
+    ''')
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS readings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            ts_ms INTEGER,
+            {", ".join(f"{m} REAL" for m in METRICS)}
+        )
+    ''')
+
+    # latest unit seen for every metric
+    for metric in METRICS:
+        row = conn.execute(
+            f"SELECT {metric}_unit FROM sensor_readings WHERE {metric}_unit IS NOT NULL ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        if row:
+            conn.execute(UNIT_SQL, (metric, row[0]))
+    conn.commit()
+
+    # copy in id chunks, ids are kept so existing references stay valid
+    last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM readings").fetchone()[0]
+    while True:
+        max_id = conn.execute(
+            "SELECT MAX(id) FROM (SELECT id FROM sensor_readings WHERE id > ? ORDER BY id LIMIT ?)",
+            (last_id, BACKFILL_CHUNK)
+        ).fetchone()[0]
+        if max_id is None:
+            break
+        conn.execute(f'''
+            INSERT INTO readings (id, timestamp, ts_ms, {", ".join(METRICS)})
+            SELECT id, timestamp, ts_ms, {", ".join(METRICS)}
+            FROM sensor_readings WHERE id > ? AND id <= ?
+        ''', (last_id, max_id))
+        conn.commit()
+        last_id = max_id
+
+    conn.execute("DROP TABLE sensor_readings")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_readings_ts_ms ON readings (ts_ms)")
+    _create_compat_view(conn)
+    conn.commit()
+    conn.execute("VACUUM")  # one-time, gives the space of the unit columns back
+
+def _add_kalman_state(conn):
+    """v3: checkpoint of the incremental Kalman filter per node and channel"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS kalman_state (
+            node TEXT,
+            channel TEXT,
+            last_id INTEGER,
+            x_post REAL,
+            P_post REAL,
+            PRIMARY KEY (node, channel)
+        )
+    ''')
+
+def _add_rollups(conn):
+    """v4: 1-min / 1-hour / 1-day rollup tables, built from the existing readings"""
+    from rollupTables import create_rollup_tables, rebuild_rollups
+    create_rollup_tables(conn)
+    rebuild_rollups(conn, metrics=METRICS)  # derived columns are added (and rolled up) by v10
+
+def _add_online_stats(conn):
+    """v5: running statistics per window bucket (see onlineStats), all-time state from existing readings"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS online_stats (
+            stats_window TEXT,
+            bucket_ms INTEGER,
+            state TEXT,
+            PRIMARY KEY (stats_window, bucket_ms)
+        )
+    ''')
+    from onlineStats import rebuild_all_time
+    rebuild_all_time(conn)
+
+def _add_gateway(conn):
+    """v6: serial port (receiver dongle) a reading came from"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(readings)")]
+    if 'gateway' not in columns:
+        conn.execute("ALTER TABLE readings ADD COLUMN gateway TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_readings_gateway_ts_ms ON readings (gateway, ts_ms)")
+    _create_compat_view(conn)
+
+def _add_log_imports(conn):
+    """v7: progress of bulk log imports (logImporter), makes re-runs idempotent"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS log_imports (
+            fingerprint TEXT PRIMARY KEY,
+            path TEXT,
+            offset INTEGER,
+            records INTEGER,
+            updated TEXT
+        )
+    ''')
+
+def _enable_incremental_vacuum(conn):
+    """v8: auto_vacuum=INCREMENTAL, free pages are given back in small slices (dataRetention)"""
+    conn.commit()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")  # one-time, the mode only takes effect after a VACUUM
+
+def _add_alerts(conn):
+    """v9: raised/cleared events of the collector's alert engine (alertEngine)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts_ms INTEGER,
+            gateway TEXT,
+            metric TEXT,
+            event TEXT,
+            value REAL,
+            threshold REAL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_ts_ms ON alerts (ts_ms)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_gateway_metric ON alerts (gateway, metric, id)")
+
+def _add_derived_metrics(conn):
+    """v10: derived columns with indexes, backfilled from the stored readings (and the archive)"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(readings)")]
+    for column in DERIVED:
+        if column not in columns:
+            conn.execute(f"ALTER TABLE readings ADD COLUMN {column} {'INTEGER' if column == 'comfort_band' else 'REAL'}")
+    _create_compat_view(conn)
+    conn.commit()
+    from derivedMetrics import backfill_archive, backfill_derived
+    from rollupTables import ROLLUP_DERIVED, rebuild_rollups
+    backfill_derived(conn)
+    backfill_archive()
+    rebuild_rollups(conn, metrics=ROLLUP_DERIVED)
+
+def _add_collector_metrics(conn):
+    """v11: snapshots of the collector's counters (collectorMetrics), read by the System Health page"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS collector_metrics (
+            ts_ms INTEGER PRIMARY KEY,
+            state TEXT
+        )
+    ''')
+
+MIGRATIONS = [
+    _add_ts_ms,
+    _normalize_units,
+    _add_kalman_state,
+    _add_rollups,
+    _add_online_stats,
+    _add_gateway,
+    _add_log_imports,
+    _enable_incremental_vacuum,
+    _add_alerts,
+    _add_derived_metrics,
+    _add_collector_metrics,
+]
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        log.info(f"Migrating database to schema version {number}")
+        migration(conn)
+        conn.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
+
+# secondary indexes of readings, dropped during bulk imports and rebuilt afterwards
+READINGS_INDEXES = {
+    'idx_readings_ts_ms': "CREATE INDEX IF NOT EXISTS idx_readings_ts_ms ON readings (ts_ms)",
+    'idx_readings_gateway_ts_ms': "CREATE INDEX IF NOT EXISTS idx_readings_gateway_ts_ms ON readings (gateway, ts_ms)",
+    'idx_readings_humidex': "CREATE INDEX IF NOT EXISTS idx_readings_humidex ON readings (humidex)",
+    'idx_readings_dew_point': "CREATE INDEX IF NOT EXISTS idx_readings_dew_point ON readings (dew_point)",
+    'idx_readings_absolute_humidity': "CREATE INDEX IF NOT EXISTS idx_readings_absolute_humidity ON readings (absolute_humidity)",
+    'idx_readings_comfort_band': "CREATE INDEX IF NOT EXISTS idx_readings_comfort_band ON readings (comfort_band, ts_ms)",
+}
+
+def delete_batched(conn, table, where, params=(), key='id', batch=DELETE_BATCH):
+    """
+    DELETE FROM table WHERE where, in transactions of at most batch rows, so the collector's
+    writer only ever waits for one small batch. key identifies a row (e.g. "(metric, bucket_ms)"
+    for WITHOUT ROWID tables). Returns the number of deleted rows.
+    """
+    total = 0
+    while True:
+        with conn:
+            deleted = conn.execute(
+                f"DELETE FROM {table} WHERE {key} IN (SELECT {key.strip('()')} FROM {table} WHERE {where} LIMIT ?)",
+                (*params, batch)
+            ).rowcount
+        total += deleted
+        if deleted < batch:
+            return total
+
+def drop_indexes(conn):
+    for name in READINGS_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+
+def create_indexes(conn):
+    # also restores indexes of an interrupted bulk import
+    for sql in READINGS_INDEXES.values():
+        conn.execute(sql)
+    conn.commit()
+
+def init_db(conn):
+    if conn.execute("PRAGMA user_version").fetchone()[0] == 0:
+        create_table(conn.cursor())
+        conn.commit()
+    migrate(conn)
+    create_indexes(conn)
+
+
+def to_epoch_ms(dt):
+    # naive datetimes are local time, as written by the collector
+    return int(dt.timestamp() * 1000)
+
+def to_local_time(ts_ms):
+    """Series of epoch ms -> naive local wall-clock datetimes, like the timestamps of the collector"""
+    local_tz = datetime.now().astimezone().tzinfo
+    return pd.to_datetime(ts_ms, unit='ms', utc=True).dt.tz_convert(local_tz).dt.tz_localize(None)
+
+def reading_row(received, sensor_data, gateway=None):
+    # missing fields are stored as None, the DERIVED slots are filled per batch by derivedMetrics.add_derived
+    return ([received.isoformat(), to_epoch_ms(received), gateway] + [sensor_data.get(metric) for metric in METRICS]
+            + [None] * len(DERIVED))
+
+def reading_units(sensor_data):
+    return {metric: sensor_data[f"{metric}_unit"] for metric in METRICS if f"{metric}_unit" in sensor_data}
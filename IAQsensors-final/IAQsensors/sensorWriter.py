@@ -0,0 +1,189 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from derivedMetrics import add_derived
+from sensorDatabase import DB_NAME, INSERT_SQL, UNIT_SQL, connect, reading_row, reading_units
+
+log = logging.getLogger(__name__)
+
+_STOP = object()    # sentinel to stop the writer thread
+RETRY_DELAY = 0.5       # s, first wait before a batch is written again after "database is locked"
+MAX_RETRY_DELAY = 30    # s, the wait doubles per attempt up to this
+
+
+def is_busy(error):
+    # another connection held the write lock longer than the busy timeout of connect()
+    return isinstance(error, sqlite3.OperationalError) and any(word in str(error) for word in ("locked", "busy"))
+
+
+class SensorDBWriter:
+    """
+    Background writer for the readings table (see sensorDatabase for the layout).
+
+    Records are put on a bounded in-memory queue and written by a dedicated thread with
+    executemany group commits. A commit happens when batch_size rows are pending or the
+    oldest pending row waited flush_interval seconds, whatever comes first. close() flushes
+    what is left. If the queue is full for longer than put_timeout the record is dropped
+    (counted in self.dropped) instead of stalling the serial reader.
+
+    on_batch: functions called as hook(conn, rows) for every batch, inside the same transaction
+    (rows as built by reading_row), e.g. to maintain rollup tables incrementally. A hook that
+    raises is rolled back to its savepoint, the readings and the other hooks are still written.
+    Hooks with in-memory state may have commit() and rollback(), called after the transaction
+    was committed or rolled back, and flush(conn), called in a last transaction when the
+    writer stops (e.g. to store state kept in memory between batches).
+    A locked database (long import, VACUUM, ...) keeps the batch, it is written again with
+    growing delays until it succeeds; meanwhile new records wait on the queue.
+    stages: functions called as stage(rows) before the insert, filling computed columns of the
+    rows in place (default: the derived metrics, see derivedMetrics).
+    metrics: collectorMetrics.CollectorMetrics, gets the duration of every transaction.
+    """
+
+    def __init__(self, db_name=DB_NAME, batch_size=200, flush_interval=1.0,
+                 max_queue=10000, put_timeout=1.0, on_batch=(), stages=(add_derived,), metrics=None):
+        self.db_name = db_name
+        self.stages = list(stages)
+        self.metrics = metrics
+        self.on_batch = list(on_batch)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = threading.Thread(target=self._run, name="SensorDBWriter", daemon=True)
+        self.units = {}     # units already stored in metric_units, only used by the writer thread
+        self.written = 0
+        self.dropped = 0
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def put(self, received, sensor_data, gateway=None):
+        # thread safe, called by the reader thread of every gateway
+        try:
+            item = (reading_row(received, sensor_data, gateway), reading_units(sensor_data))
+            self.queue.put(item, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            log.warning(f"Writer queue full, dropped record from {received.isoformat()}")
+            return False
+
+    def close(self):
+        self.queue.put(_STOP)
+        self.thread.join()
+
+    def _run(self):
+        # connection is created in the writer thread and only used there
+        conn = connect(self.db_name)
+        batch = []
+        deadline = None
+        stopping = False
+
+        while not stopping:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            # drain whatever else is already waiting, up to one batch
+            while item is not None:
+                if item is _STOP:
+                    stopping = True
+                    break
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(conn, batch)
+                batch = []
+
+        self._flush_hooks(conn)
+        conn.close()
+
+    def _flush(self, conn, batch):
+        # units only change when a sensor is replaced, so usually nothing to write here
+        changed = {}
+        for _, units in batch:
+            for metric, unit in units.items():
+                if self.units.get(metric) != unit:
+                    changed[metric] = unit
+        rows = [row for row, _ in batch]
+        for stage in self.stages:
+            try:
+                stage(rows)
+            except Exception:
+                log.exception(f"Stage {_name(stage)} failed, its columns stay empty")
+
+        delay = RETRY_DELAY
+        while True:
+            try:
+                started = time.perf_counter()
+                with conn:  # one transaction per batch, rollback on error
+                    conn.executemany(INSERT_SQL, rows)
+                    if changed:
+                        conn.executemany(UNIT_SQL, changed.items())
+                    for hook in self.on_batch:
+                        self._call_hook(conn, hook, rows)
+            except sqlite3.Error as e:
+                self._end_hooks('rollback')
+                if is_busy(e):
+                    log.warning(f"Database busy ({e}), writing {len(batch)} records again in {delay:g} s")
+                    time.sleep(delay)
+                    delay = min(delay * 2, MAX_RETRY_DELAY)
+                    continue
+                log.error(f"Error writing {len(batch)} records: {e}")
+                return
+            self._end_hooks('commit')
+            if self.metrics is not None:
+                self.metrics.commit(time.perf_counter() - started)
+            self.units.update(changed)
+            self.written += len(batch)
+            return
+
+    def _call_hook(self, conn, hook, rows):
+        conn.execute("SAVEPOINT batch_hook")
+        try:
+            hook(conn, rows)
+        except Exception as e:
+            if is_busy(e):
+                raise   # the whole batch is written again
+            conn.execute("ROLLBACK TO batch_hook")
+            if hasattr(hook, 'rollback'):
+                hook.rollback()
+            log.exception(f"Batch hook {_name(hook)} failed, skipped for {len(rows)} records")
+        conn.execute("RELEASE batch_hook")
+
+    def _flush_hooks(self, conn):
+        hooks = [hook for hook in self.on_batch if hasattr(hook, 'flush')]
+        if not hooks:
+            return
+        try:
+            with conn:
+                for hook in hooks:
+                    hook.flush(conn)
+        except sqlite3.Error as e:
+            log.error(f"Storing the state of the batch hooks failed: {e}")
+            return
+        for hook in hooks:
+            if hasattr(hook, 'commit'):
+                hook.commit()
+
+    def _end_hooks(self, action):
+        for hook in self.on_batch:
+            if hasattr(hook, action):
+                getattr(hook, action)()
+
+
+def _name(func):
+    return getattr(func, '__name__', type(func).__name__)
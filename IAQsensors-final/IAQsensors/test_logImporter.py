@@ -0,0 +1,35 @@
+from logImporter import import_log
+from sensorDatabase import connect, init_db
+
+# one frame as written to serial_log.txt, the unit's µ is a single 0xB5 byte
+FRAME = (
+    b'2025-06-24 13:51:09,941 - {\n'
+    b'2025-06-24 13:51:09,950 - "co2": "575",\n'
+    b'2025-06-24 13:51:10,012 - "typical_particle_size": "0.683028",\n'
+    b'2025-06-24 13:51:10,015 - "typical_particle_size_unit": "\xb5m"\n'
+    b'2025-06-24 13:51:10,015 - }\n'
+)
+
+
+def test_import_keeps_latin1_unit(tmp_path):
+    log = tmp_path / "serial_log.txt"
+    log.write_bytes(FRAME)
+    conn = connect(str(tmp_path / "sensor.db"))
+    init_db(conn)
+
+    assert import_log(conn, str(log)) == 1
+    assert conn.execute("SELECT unit FROM metric_units WHERE metric = 'typical_particle_size'").fetchone() == ("µm",)
+    conn.close()
+
+
+def test_import_does_not_replace_stored_unit(tmp_path):
+    log = tmp_path / "serial_log.txt"
+    log.write_bytes(FRAME.replace(b"\xb5m", b"m"))
+    conn = connect(str(tmp_path / "sensor.db"))
+    init_db(conn)
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO metric_units (metric, unit) VALUES ('typical_particle_size', 'µm')")
+
+    import_log(conn, str(log))
+    assert conn.execute("SELECT unit FROM metric_units WHERE metric = 'typical_particle_size'").fetchone() == ("µm",)
+    conn.close()
@@ -1,4 +1,7 @@
+import threading
+from functools import lru_cache
 import plotly.graph_objects as go
+import streamlit as st
 
 def create_gauge(title, value, comfort_label, color, max_value):
     fig = go.Figure(go.Indicator(
@@ -19,6 +22,53 @@ def create_gauge(title, value, comfort_label, color, max_value):
     )  
     return fig
 
+class GaugeTemplate:
+    """
+    Gauge figure built once and shared by all sessions. Building and validating a go.Figure
+    takes milliseconds, patching the value and bar colour of an existing one a fraction of that.
+    The lock keeps sessions from patching while another one is being serialized.
+    """
+
+    def __init__(self, title, max_value):
+        self.figure = create_gauge(title, 0, "", "gray", max_value)
+        self.lock = threading.Lock()
+
+    def plot(self, value, color, **kwargs):
+        with self.lock:
+            indicator = self.figure.data[0]
+            indicator.value = value
+            indicator.gauge.bar.color = color
+            st.plotly_chart(self.figure, **kwargs)    # serialized right here, inside the lock
+
+@lru_cache(maxsize=64)
+def gauge_template(title, max_value):
+    return GaugeTemplate(title, max_value)
+
+def plot_gauge(title, value, color, max_value, **kwargs):
+    # cached figure per title and range, only value and colour change per update
+    gauge_template(title, max_value).plot(value, color, **kwargs)
+
+@lru_cache(maxsize=64)
+def legend_html(levels):
+    """Legend of all comfort levels, levels: tuple of (threshold, label, color)"""
+    legend = '<div style="text-align:center; margin-top: 0.5em;">'
+    for _, lvl_label, lvl_color in levels:
+        legend += (
+            f'<span style="display:inline-flex; align-items:center; margin:0 8px;">'
+            f'<span style="display:inline-block; width:16px; height:16px; background:{lvl_color}; border-radius:3px; margin-right:6px; border:1px solid #888;"></span>'
+            f'<span style="color:#111;">{lvl_label}</span>'
+            f'</span>'
+        )
+    return legend + '</div>'
+
+@lru_cache(maxsize=256)
+def label_html(label, info):
+    # current comfort label, centered, with info icon
+    return f"""<div style="text-align:center;">
+                        <strong>{label}</strong>
+                        <span title="{info}" style="cursor: pointer;">&#8505;</span>
+                    </div>"""
+
 def get_unit_mapping(df):
     # Create a mapping from pollutant to its unit
     unit_map = {}